@@ -0,0 +1,416 @@
+# bench.py
+# Offline benchmark voor checker.py tegen een lokale nep-portal (geen internet nodig).
+# De portal heeft: loginformulier met CSRF-token, 401 + loginformulier zonder sessie,
+# server-side pagina (/meetings, met ETag) en JS-gerenderde pagina (/app), met of zonder
+# "Geen dagen gevonden.", plus een stub voor de Telegram-API.
+#
+# Gebruik:
+#   python bench.py                       # alle scenario's, 30 checks per scenario
+#   python bench.py -n 50 --only requests,main-requests
+#   python bench.py --save-baseline bench_baseline.json
+#   python bench.py --baseline bench_baseline.json      # vergelijk; exit 1 bij regressie
+# bench_baseline.json in de repo is gemeten met de defaults (-n 30, zonder playwright). kB per
+# scenario is machine-onafhankelijk (alleen vergeleken bij dezelfde -n); voor tijden eerst een
+# eigen baseline opslaan op dezelfde machine (en die niet committen, tenzij het de referentie is).
+# rss = piek-RSS van het bench-proces per scenario (Linux, /proc/self/clear_refs); met * erachter
+# is het de procesbrede piek (ru_maxrss), die alleen kan stijgen.
+#   python bench.py --startup                           # starttijd: import-budget, one-shot vs --via worker
+# Playwright-scenario's worden overgeslagen als playwright niet geïnstalleerd is.
+# Na de scenario's volgen correctheidschecks: een JS-pagina zonder dagen mag nooit een alert
+# geven (NO_ALERT_CASES) en slots worden goed uit de regio gehaald (SLOT_CASES); anders exit 1.
+
+import os, io, sys, json, time, uuid, secrets, argparse, tempfile, threading, resource, contextlib, traceback
+import subprocess, statistics
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from http.cookies import SimpleCookie
+
+USER, PASS = "bench@example.com", "hunter2"
+MARKER = "Geen dagen gevonden."
+
+# ====== nep-portal ======
+PORTAL = {"available": False, "sessions": set(), "csrf": set(), "bytes": 0, "requests": 0,
+          "logins": 0, "telegram": 0, "lock": threading.Lock()}
+
+LOGIN_FORM = """<html><head><title>Inloggen</title></head><body>
+<form method="post" action="/login">
+  <input type="hidden" name="csrf_token" value="{csrf}">
+  <label>Emailadres <input name="email" type="email"></label>
+  <label>Wachtwoord <input name="password" type="password"></label>
+  <button type="submit">Inloggen</button>
+</form></body></html>"""
+
+def days_html():
+    if PORTAL["available"]:
+        items = "".join(f"<li class='day'>{d} oktober 2026 09:00</li>" for d in (20, 21, 23))
+        return f"<ul>{items}</ul>"
+    return f"<p>{MARKER}</p>"
+
+def meetings_page():
+    filler = "".join(f"<div class='news'><h3>Bericht {i}</h3><p>{'Lorem ipsum dolor sit amet. ' * 20}</p></div>"
+                     for i in range(40))
+    return (f"<html><head><title>Afspraken</title><script>var cfg={{}};</script></head><body>"
+            f"<nav>Menu Uitloggen</nav><h1>Afspraken plannen</h1>{filler}"
+            f"<section id='days'>{days_html()}</section><footer>Portal</footer></body></html>")
+
+APP_PAGE = """<html><head><title>Afspraken</title></head><body><h1>Afspraken plannen</h1>
+<section id="days"></section>
+<script>fetch('/api/days').then(r => r.text()).then(t => { document.getElementById('days').innerHTML = t; });</script>
+</body></html>"""
+
+class PortalHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *a):
+        pass
+
+    def _send(self, code, body="", ctype="text/html; charset=utf-8", headers=None):
+        data = body.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+        with PORTAL["lock"]:
+            PORTAL["bytes"] += len(data)
+            PORTAL["requests"] += 1
+
+    def _authed(self):
+        c = SimpleCookie(self.headers.get("Cookie") or "")
+        return "sid" in c and c["sid"].value in PORTAL["sessions"]
+
+    def _login_form(self, code=200):
+        csrf = secrets.token_hex(8)
+        PORTAL["csrf"].add(csrf)
+        self._send(code, LOGIN_FORM.format(csrf=csrf))
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/login":
+            return self._login_form()
+        if path in ("/meetings", "/app", "/api/days") and not self._authed():
+            return self._login_form(401)   # 401 met loginformulier: requests ziet de status, de browser het formulier
+        if path == "/meetings":
+            body = meetings_page()
+            etag = '"%x"' % (hash(body) & 0xffffffff)
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, "", headers={"ETag": etag})
+            return self._send(200, body, headers={"ETag": etag})
+        if path == "/app":
+            return self._send(200, APP_PAGE)
+        if path == "/api/days":
+            return self._send(200, days_html())
+        self._send(404, "not found")
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        n = int(self.headers.get("Content-Length") or 0)
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(n).decode("utf-8")).items()}
+        if path == "/login":
+            ok = (form.get("email") == USER and form.get("password") == PASS
+                  and form.get("csrf_token") in PORTAL["csrf"])
+            if not ok:
+                return self._login_form(403)
+            sid = uuid.uuid4().hex
+            PORTAL["sessions"].add(sid)
+            PORTAL["logins"] += 1
+            return self._send(302, "", headers={"Location": "/meetings", "Set-Cookie": f"sid={sid}; Path=/; HttpOnly"})
+        if path.startswith("/bot") and path.endswith("/sendMessage"):
+            PORTAL["telegram"] += 1
+            return self._send(200, '{"ok":true}', ctype="application/json")
+        self._send(404, "not found")
+
+def start_portal():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), PortalHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://127.0.0.1:{srv.server_address[1]}"
+
+# ====== harness ======
+def percentile(vals, pct):
+    vals = sorted(vals)
+    if not vals: return None
+    k = max(0, min(len(vals) - 1, -(-len(vals) * pct // 100) - 1))
+    return vals[int(k)]
+
+def reset_checker(checker, fresh_session=True):
+    for f in ("state.json", "state.db", "state.db-wal", "state.db-shm", "page_cache.json",
+              "fetch_paths.json", "login_hints.json", "metrics.jsonl", checker.SESSION_FILE if fresh_session else ""):
+        if f and os.path.exists(f):
+            os.remove(f)
+    checker._STORE["store"] = None
+    if fresh_session:
+        checker._HTTP["session"] = None
+        checker.close_browser()
+
+def reset_peak_rss():
+    """Linux: piek-RSS (VmHWM) terugzetten naar de huidige RSS, zodat elk scenario zijn eigen piek
+    meet. False als dat niet kan (dan is rss_peak_mb de procesbrede piek, ru_maxrss)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    """Piek-RSS van dit proces in MB (browser-processen van Playwright tellen niet mee)."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def run_scenario(checker, name, fn, n, flip_every, cold, verbose=False):
+    reset_checker(checker)
+    per_scenario = reset_peak_rss()
+    before = {k: PORTAL[k] for k in ("bytes", "requests", "logins", "telegram")}
+    lat, errors = [], 0
+    started = time.perf_counter()
+    for i in range(n):
+        if flip_every and i and i % flip_every == 0:
+            PORTAL["available"] = not PORTAL["available"]
+        if cold:
+            reset_checker(checker)
+        out = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        t0 = time.perf_counter()
+        try:
+            with out:
+                fn()
+        except Exception:
+            errors += 1
+            if errors == 1:
+                traceback.print_exc()
+        lat.append((time.perf_counter() - t0) * 1000)
+    wall = time.perf_counter() - started
+    checker.notifier.flush_all()   # telegram-teller pas lezen als de achtergrond-queue leeg is
+    PORTAL["available"] = False
+    d = {k: PORTAL[k] - before[k] for k in before}
+    return {
+        "scenario": name, "checks": n, "errors": errors,
+        "p50_ms": round(percentile(lat, 50), 1), "p95_ms": round(percentile(lat, 95), 1),
+        "checks_per_min": round(n / wall * 60, 1),
+        "rss_peak_mb": peak_rss_mb(), "rss_scope": "scenario" if per_scenario else "process",
+        "kb_fetched": round(d["bytes"] / 1024, 1), "http_requests": d["requests"],
+        "logins": d["logins"], "telegram": d["telegram"],
+    }
+
+def scenarios(checker, base):
+    def main_with(mode, target):
+        def f():
+            checker.FETCH_MODE, checker.TARGET_URL = mode, target
+            checker.check_once()
+        return f
+    def only_requests():
+        checker.TARGET_URL = base + "/meetings"
+        checker.fetch_via_requests()
+    def only_playwright():
+        checker.TARGET_URL = base + "/app"
+        checker.fetch_via_playwright()
+
+    out = [("requests", only_requests, False), ("requests-cold", only_requests, True),
+           ("main-requests", main_with("requests", base + "/meetings"), False),
+           ("main-auto-ssr", main_with("auto", base + "/meetings"), False),
+           ("main-hedged-ssr", main_with("hedged", base + "/meetings"), False)]
+    try:
+        import playwright  # noqa: F401
+        out += [("playwright", only_playwright, False), ("playwright-cold", only_playwright, True),
+                ("main-playwright", main_with("playwright", base + "/app"), False),
+                ("main-auto-js", main_with("auto", base + "/app"), False),
+                ("main-hedged-js", main_with("hedged", base + "/app"), False)]
+    except ImportError:
+        print("playwright niet geïnstalleerd → browser-scenario's overgeslagen.", file=sys.stderr)
+    return out
+
+# JS-rendered pagina terwijl er niets beschikbaar is: de lege HTTP-shell mag nooit een alert geven
+NO_ALERT_CASES = (("main-auto-js", "auto", "/app"), ("main-hedged-js", "hedged", "/app"))
+
+def no_alert_checks(checker, base, n=3):
+    """Correctheid i.p.v. snelheid; geeft een lijst met problemen terug."""
+    try:
+        import playwright  # noqa: F401
+        have_pw = True
+    except ImportError:
+        have_pw = False   # escaleren naar de browser faalt dan; géén alert is nog steeds de eis
+    problems = []
+    for name, mode, path in NO_ALERT_CASES:
+        reset_checker(checker)
+        PORTAL["available"] = False
+        before = PORTAL["telegram"]
+        checker.FETCH_MODE, checker.TARGET_URL = mode, base + path
+        statuses = []
+        for _ in range(n):
+            try:
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                    statuses.append(checker.check_once()["status"])
+            except Exception as e:
+                statuses.append(None)
+                if have_pw: problems.append(f"{name}: {e!r}")
+        checker.notifier.flush_all()
+        alerts = PORTAL["telegram"] - before
+        learned = (checker.load_fetch_paths().get(checker.TARGET_URL) or {}).get("path")
+        if alerts or "BESCHIKBAAR" in statuses:
+            problems.append(f"{name}: vals alarm ({alerts} telegram, status {statuses})")
+        if learned == "requests":
+            problems.append(f"{name}: lege HTTP-shell als beslissend onthouden")
+        print(f"{name:<18} no-alert: telegram={alerts} status={statuses}", flush=True)
+    return problems
+
+# slot-extractie (CSS_SELECTOR="#days", default SLOT_SELECTOR), ook met weggelaten eindtags
+SLOT_CASES = (
+    ("<ul id='days'><li>20 okt</li><li>21 <b>okt</b></li></ul>", ["20 okt", "21 okt"]),
+    ("<ul id='days'><li>20 okt<li>21 okt<li>23 okt</ul><p>Menu</p>", ["20 okt", "21 okt", "23 okt"]),
+    ("<select id='days'><option>20 okt<option>21 okt</select>", ["20 okt", "21 okt"]),
+    ("<table id='days'><tr><td>20 okt<td>09:00<tr><td>21 okt<td>10:00</table>", ["20 okt 09:00", "21 okt 10:00"]),
+    ("<table id='days'><tbody><tr><th>20 okt<td><b>09:00<tr><th>21 okt<td>10:00</tbody></table>",
+     ["20 okt 09:00", "21 okt 10:00"]),
+    ("<div id='days'><ul><li>20 okt<li>21 okt</ul></div><ul><li>Menu</ul>", ["20 okt", "21 okt"]),
+)
+
+def slot_checks(checker):
+    problems = []
+    for css in ("#days", "div#days, ul#days, select#days, table#days"):   # streaming en BeautifulSoup
+        t = dict(checker.env_target(), css_selector=css, slot_selector="li,tr,option")
+        for html, want in SLOT_CASES:
+            got = checker.scan_html(html, t)["slots"]
+            if got != want:
+                problems.append(f"slots {html!r} ({css}): {got} != {want}")
+    print(f"{'slots':<18} {len(SLOT_CASES) * 2 - len(problems)}/{len(SLOT_CASES) * 2} ok", flush=True)
+    return problems
+
+def compare(results, baseline, tolerance, min_ms=5.0):
+    base = {r["scenario"]: r for r in baseline}
+    regressions = []
+    print(f"\n{'scenario':<18}{'p50 Δ':>10}{'p95 Δ':>10}{'kB Δ':>10}")
+    for r in results:
+        b = base.get(r["scenario"])
+        if not b: continue
+        d = {k: (r[k] - b[k]) / b[k] * 100 if b[k] else 0.0 for k in ("p50_ms", "p95_ms", "kb_fetched")}
+        # kB hangt van -n af (eerste check haalt alles, daarna vooral 304's): alleen bij gelijke n
+        same_n = r["checks"] == b["checks"]
+        kb = f"{d['kb_fetched']:>+9.0f}%" if same_n else f"{'n/a':>10}"
+        print(f"{r['scenario']:<18}{d['p50_ms']:>+9.0f}%{d['p95_ms']:>+9.0f}%{kb}"
+              + ("" if same_n else f"  ({r['checks']} vs {b['checks']} checks)"))
+        slower = d["p50_ms"] > tolerance and r["p50_ms"] - b["p50_ms"] > min_ms   # ms-ruis negeren
+        if slower or (same_n and d["kb_fetched"] > tolerance):
+            regressions.append(r["scenario"])
+    return regressions
+
+# ====== starttijd ======
+HEAVY_MODULES = ("requests", "bs4", "playwright")   # mogen niet bij `import checker` geladen worden
+
+def _run_ms(cmd, **kw):
+    t0 = time.perf_counter()
+    r = subprocess.run(cmd, capture_output=True, text=True, **kw)
+    return (time.perf_counter() - t0) * 1000, r
+
+def startup_bench(repo, n, budget_ms):
+    """Meet import- en one-shot-tijd in verse interpreters; geeft een lijst met problemen terug."""
+    py, script = sys.executable, os.path.join(repo, "checker.py")
+    env = dict(os.environ, PYTHONPATH=repo, FETCH_MODE="requests", DAEMON_GIT_COMMIT="0",
+               WORKER_SOCKET=os.path.join(os.getcwd(), "bench.sock"), WORKER_IDLE_SEC="120")
+    med = lambda cmd: statistics.median(_run_ms(cmd, env=env)[0] for _ in range(n))
+    problems = []
+
+    interp = med([py, "-c", "pass"])
+    import_ms = med([py, "-c", "import checker"]) - interp
+    _, r = _run_ms([py, "-c", "import sys, checker; print(','.join(m for m in %r if m in sys.modules))"
+                    % (HEAVY_MODULES,)], env=env)
+    eager = r.stdout.strip()
+    print(f"interpreter        {interp:>7.1f}ms")
+    print(f"import checker     {import_ms:>7.1f}ms (budget {budget_ms:.0f}ms)"
+          + (f", eager: {eager}" if eager else ""))
+    if import_ms > budget_ms:
+        problems.append(f"import checker {import_ms:.0f}ms > budget {budget_ms:.0f}ms")
+    if eager:
+        problems.append(f"eager imports: {eager}")
+
+    oneshot = med([py, script])
+    print(f"one-shot check     {oneshot:>7.1f}ms")
+    worker = subprocess.Popen([py, script, "--serve"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            if os.path.exists(env["WORKER_SOCKET"]): break
+            time.sleep(0.05)
+        _run_ms([py, script, "--via"], env=env)   # eerste check warmt de worker op
+        via = med([py, script, "--via"])
+        print(f"check via worker   {via:>7.1f}ms")
+    finally:
+        worker.terminate(); worker.wait(10)
+    return problems
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline benchmark voor checker.py")
+    ap.add_argument("-n", type=int, default=30, help="checks per scenario")
+    ap.add_argument("--only", default="", help="komma-gescheiden scenario-namen")
+    ap.add_argument("--flip-every", type=int, default=10, help="wissel beschikbaarheid elke N checks (0 = nooit)")
+    ap.add_argument("--save-baseline", metavar="FILE")
+    ap.add_argument("--baseline", metavar="FILE", help="vergelijk met opgeslagen baseline")
+    ap.add_argument("--tolerance", type=float, default=20.0, help="max %% regressie t.o.v. baseline")
+    ap.add_argument("-v", "--verbose", action="store_true", help="output van checker.py tonen")
+    ap.add_argument("--startup", action="store_true", help="alleen starttijd meten (verse interpreters)")
+    ap.add_argument("--startup-budget-ms", type=float, default=60.0, help="max importtijd van checker.py")
+    args = ap.parse_args()
+
+    srv, base = start_portal()
+    workdir = tempfile.mkdtemp(prefix="checker-bench-")
+    repo = os.path.dirname(os.path.abspath(__file__))
+    os.environ.update({
+        "LOGIN_URL": base + "/login", "TARGET_URL": base + "/meetings",
+        "SITE_USERNAME": USER, "SITE_PASSWORD": PASS,
+        "TELEGRAM_BOT_TOKEN": "bench", "TELEGRAM_CHAT_ID": "1", "TELEGRAM_API": base,
+        "NOTIFY_COALESCE_SEC": "0", "NOTIFY_MIN_INTERVAL_SEC": "0",
+        "CONFIRM_TEXT": "Afspraken plannen", "CSS_SELECTOR": "#days", "READY_TIMEOUT_MS": "3000",
+    })
+    os.chdir(workdir)   # state/caches/metrics van de bench niet in de repo
+    if args.startup:
+        try:
+            problems = startup_bench(repo, max(3, min(args.n, 10)), args.startup_budget_ms)
+        finally:
+            srv.shutdown(); os.chdir(repo)
+        for p in problems:
+            print(f"Startup: {p}", file=sys.stderr)
+        return 1 if problems else 0
+    sys.path.insert(0, repo)
+    import checker
+
+    wanted = {s for s in args.only.split(",") if s}
+    results, problems = [], []
+    try:
+        for name, fn, cold in scenarios(checker, base):
+            if wanted and name not in wanted: continue
+            r = run_scenario(checker, name, fn, args.n, args.flip_every, cold, args.verbose)
+            results.append(r)
+            print(f"{name:<18} p50={r['p50_ms']:>7.1f}ms p95={r['p95_ms']:>7.1f}ms "
+                  f"{r['checks_per_min']:>7.1f}/min rss={r['rss_peak_mb']}MB{'' if r['rss_scope'] == 'scenario' else '*'} kB={r['kb_fetched']:>8.1f} "
+                  f"req={r['http_requests']} logins={r['logins']} err={r['errors']}", flush=True)
+        problems = no_alert_checks(checker, base, max(2, min(args.n, 5))) + slot_checks(checker)
+    finally:
+        checker.close_browser(stop=True)
+        srv.shutdown()
+
+    os.chdir(repo)
+    for p in problems:
+        print(f"Correctheid: {p}", file=sys.stderr)
+    if problems:
+        return 1
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved: {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressie (> {args.tolerance:.0f}%): {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
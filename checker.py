@@ -4,46 +4,58 @@
 # - SITE_USERNAME, SITE_PASSWORD
 # - TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
 # Optioneel (Variables):
+# - NOTIFY_COALESCE_SEC, NOTIFY_MIN_INTERVAL_SEC, NOTIFY_MAX_RETRIES: zie notifier.py
 # - EXPECTED_HOST, EXPECTED_PATH, CONFIRM_TEXT, CSS_SELECTOR
-# - DEBUG_SNAPSHOT ("1" om HTML/PNG artifacts te schrijven)
+# - SLOT_SELECTOR (default "li,tr,option"; "off" = uit): losse dagen/slots binnen CSS_SELECTOR.
+#   Per slot een fingerprint in de state; alleen nieuw verschenen slots geven een alert.
+#   Eenvoudige selectors (komma-gescheiden) worden tijdens het streamen gematcht.
+# - DEBUG_SNAPSHOT ("1" = snapshots bij verandering/anomalie/steekproef; zie snapshots.py)
 # - LOGIN_USERNAME_SELECTOR, LOGIN_PASSWORD_SELECTOR, LOGIN_SUBMIT_SELECTOR
 # - USE_PLAYWRIGHT ("1" standaard), USER_AGENT
+# - FETCH_MODE ("playwright" | "requests" | "auto" | "hedged"; default volgt USE_PLAYWRIGHT)
+#   auto = eerst goedkope HTTP-fetch, browser alleen als dat niet beslissend is
+#   hedged = HTTP en (na HEDGE_DELAY_SEC, default 1.5) browser parallel; eerste beslissende verdict wint
+# - FETCH_PATHS_FILE (default "fetch_paths.json"), HYBRID_REPROBE_EVERY (default 20)
+# - PAGE_CACHE_FILE (default "page_cache.json": ETag/Last-Modified + hashes van de vorige check;
+#   vervalt als TEXT_TO_FIND/CONFIRM_TEXT/CSS_SELECTOR/SLOT_SELECTOR/EXPECTED_* wijzigen)
+# - LOGIN_HINTS_FILE (default "login_hints.json"): per LOGIN_URL de selectors/submit die laatst werkten
+# - BLOCK_RESOURCES ("1" standaard): onnodige requests in de browser blokkeren
+#   BLOCK_RESOURCE_TYPES (default "image,media,font"; "stylesheet" kan, maar raakt is_visible())
+#   BLOCK_URL_PATTERNS (substrings, komma-gescheiden; default bekende analytics/ads)
+#   ALLOW_URL_PATTERNS (substrings die nooit geblokkeerd worden, bv. scripts die de SPA nodig heeft)
+# - READY_TIMEOUT_MS (default 5000): max wachten op de marker zonder CSS_SELECTOR (verschijnt hij
+#   niet, dan is er iets beschikbaar; CONFIRM_TEXT telt niet, die staat al in de lege shell)
+# - METRICS_FILE (default "metrics.jsonl"; leeg = uit): één JSON-record per check
+# - TRACE_FILE (optioneel): Chrome trace-event JSON van alle fases (chrome://tracing / Perfetto)
+# - PROFILE_CHECK ("1" = elke check onder cProfile; PROFILE_FILE default "last_profile.prof" + .txt)
 # - TEXT_TO_FIND (default: "Geen dagen gevonden.")
+# - TARGET_NAME (sleutel in de state, default "default")
+# - STATE_BACKEND ("json" standaard | "sqlite"), STATE_FILE, STATE_DB: zie state_store.py
 # - USERNAME_FIELD, PASSWORD_FIELD (alleen voor requests-fallback)
+# - SESSION_FILE (default "session.json"), SESSION_TTL_SEC (default 21600; 0 = geen cache)
+# Daemon (python checker.py --daemon):
+# - MIN_SLEEP_SEC, MAX_SLEEP_SEC (grenzen van het interval tussen checks)
+# - DAEMON_CHECK_BUDGET, HOT_WINDOW_MIN, HOT_BOOST, SLOW_CHECK_SEC, ...: adaptieve planning, zie scheduler.py
+# - QUIET_TZ, QUIET_START, QUIET_END (geen checks in dit venster)
+# - DAEMON_DURATION_SEC (default 19800 = 5u30), DAEMON_MAX_CHECKS (0 = onbeperkt)
+# - BROWSER_RECYCLE_CHECKS (browser herstarten na N checks), DAEMON_GIT_COMMIT ("1" standaard)
+# - TEST_MODE ("1" = heartbeat-push als er niets veranderde)
+# - GIT_SYNC_INTERVAL_SEC (default 600): state hoogstens zo vaak naar git pushen (0 = direct)
+# Pre-warmed worker (python checker.py --serve; checks met python checker.py --via):
+# - WORKER_SOCKET (default ".checker.sock"), WORKER_IDLE_SEC (default 900; 0 = nooit stoppen)
+#   De worker houdt imports, HTTP-sessie en browser warm en leest per check de env van de client.
 
-import os, sys, time, json, re, traceback
-from html import unescape
+import os, sys, time, json, re, hashlib, threading, contextlib, subprocess, traceback
+import datetime as dt
+from zoneinfo import ZoneInfo
+import state_store, notifier, scheduler, snapshots
+from html.parser import HTMLParser
 from urllib.parse import urlparse
-import requests
-from bs4 import BeautifulSoup
+# requests en bs4 worden pas geladen als een pad ze nodig heeft (snellere start; zie bench.py --startup)
 
 # ====== ENV ======
-LOGIN_URL       = os.getenv("LOGIN_URL")
-TARGET_URL      = os.getenv("TARGET_URL")
-USERNAME        = os.getenv("SITE_USERNAME")
-PASSWORD        = os.getenv("SITE_PASSWORD")
-
-# requests-fallback (alleen als de site pure server-side login heeft)
-USERNAME_FIELD  = os.getenv("USERNAME_FIELD", "email")
-PASSWORD_FIELD  = os.getenv("PASSWORD_FIELD", "password")
-
-TEXT_TO_FIND    = os.getenv("TEXT_TO_FIND", "Geen dagen gevonden.")
-CONFIRM_TEXT    = (os.getenv("CONFIRM_TEXT") or "").strip()
-EXPECTED_HOST   = (os.getenv("EXPECTED_HOST") or "").strip()
-EXPECTED_PATH   = (os.getenv("EXPECTED_PATH") or "").strip()
-CSS_SELECTOR    = (os.getenv("CSS_SELECTOR") or "").strip()
-
-TELEGRAM_TOKEN  = os.getenv("TELEGRAM_BOT_TOKEN")
-TELEGRAM_CHATID = os.getenv("TELEGRAM_CHAT_ID")
-USER_AGENT      = os.getenv("USER_AGENT","Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36")
-
-DEBUG_SNAPSHOT  = os.getenv("DEBUG_SNAPSHOT","0") == "1"
-USE_PLAYWRIGHT  = os.getenv("USE_PLAYWRIGHT","1") == "1"  # default aan
-
-# optionele overrides (Variables)
-LOGIN_USERNAME_SELECTOR = os.getenv("LOGIN_USERNAME_SELECTOR")  # bv input[name="email"]
-LOGIN_PASSWORD_SELECTOR = os.getenv("LOGIN_PASSWORD_SELECTOR")  # bv input[name="password"]
-LOGIN_SUBMIT_SELECTOR   = os.getenv("LOGIN_SUBMIT_SELECTOR")    # bv button[type="submit"]
+def _csv_env(name, default=""):
+    return [x.strip() for x in (os.getenv(name) or default).split(",") if x.strip()]
 
 def _json_env(name, default):
     raw = os.getenv(name)
@@ -54,33 +66,255 @@ def _json_env(name, default):
     except json.JSONDecodeError:
         return default
 
-EXTRA_FIELDS = _json_env("EXTRA_FIELDS_JSON", {})
+_CLIENT_KEY = {"key": None}   # instellingen waarmee _HTTP/_PW gemaakt zijn
+
+def load_config():
+    """(Her)leest alle instellingen uit os.environ (ook die van state_store, notifier, scheduler en
+    snapshots); bij import en per check in de worker (--serve). Veranderen user-agent, sessie-cache
+    of resource-blocking, dan worden HTTP-sessie en browser-context opnieuw opgebouwd."""
+    global LOGIN_URL, TARGET_URL, USERNAME, PASSWORD, USERNAME_FIELD, PASSWORD_FIELD, TEXT_TO_FIND, \
+           CONFIRM_TEXT, EXPECTED_HOST, EXPECTED_PATH, CSS_SELECTOR, SLOT_SELECTOR, TARGET_NAME, TELEGRAM_TOKEN, \
+           TELEGRAM_CHATID, TELEGRAM_API, USER_AGENT, DEBUG_SNAPSHOT, USE_PLAYWRIGHT, FETCH_MODE, \
+           FETCH_PATHS_FILE, HYBRID_REPROBE_EVERY, HEDGE_DELAY_SEC, PAGE_CACHE_FILE, \
+           LOGIN_HINTS_FILE, BLOCK_RESOURCES, BLOCK_RESOURCE_TYPES, BLOCK_URL_PATTERNS, \
+           ALLOW_URL_PATTERNS, READY_TIMEOUT_MS, METRICS_FILE, TRACE_FILE, PROFILE_CHECK, \
+           PROFILE_FILE, LOGIN_USERNAME_SELECTOR, LOGIN_PASSWORD_SELECTOR, LOGIN_SUBMIT_SELECTOR, \
+           EXTRA_FIELDS, SESSION_FILE, SESSION_TTL_SEC, MIN_SLEEP_SEC, MAX_SLEEP_SEC, QUIET_TZ, \
+           QUIET_START, QUIET_END, DAEMON_DURATION_SEC, DAEMON_MAX_CHECKS, BROWSER_RECYCLE_CHECKS, \
+           DAEMON_GIT_COMMIT, TEST_MODE, GIT_SYNC_INTERVAL_SEC, WORKER_SOCKET, WORKER_IDLE_SEC
+    LOGIN_URL       = os.getenv("LOGIN_URL")
+    TARGET_URL      = os.getenv("TARGET_URL")
+    USERNAME        = os.getenv("SITE_USERNAME")
+    PASSWORD        = os.getenv("SITE_PASSWORD")
+
+    # requests-fallback (alleen als de site pure server-side login heeft)
+    USERNAME_FIELD  = os.getenv("USERNAME_FIELD", "email")
+    PASSWORD_FIELD  = os.getenv("PASSWORD_FIELD", "password")
+
+    TEXT_TO_FIND    = os.getenv("TEXT_TO_FIND", "Geen dagen gevonden.")
+    CONFIRM_TEXT    = (os.getenv("CONFIRM_TEXT") or "").strip()
+    EXPECTED_HOST   = (os.getenv("EXPECTED_HOST") or "").strip()
+    EXPECTED_PATH   = (os.getenv("EXPECTED_PATH") or "").strip()
+    CSS_SELECTOR    = (os.getenv("CSS_SELECTOR") or "").strip()
+    SLOT_SELECTOR   = (os.getenv("SLOT_SELECTOR") or "li,tr,option").strip()
+    if SLOT_SELECTOR.lower() == "off": SLOT_SELECTOR = ""
+    TARGET_NAME     = (os.getenv("TARGET_NAME") or "default").strip()
+
+    TELEGRAM_TOKEN  = os.getenv("TELEGRAM_BOT_TOKEN")
+    TELEGRAM_CHATID = os.getenv("TELEGRAM_CHAT_ID")
+    TELEGRAM_API    = os.getenv("TELEGRAM_API", "https://api.telegram.org")  # override voor bench/tests
+    USER_AGENT      = os.getenv("USER_AGENT","Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36")
+
+    DEBUG_SNAPSHOT  = os.getenv("DEBUG_SNAPSHOT","0") == "1"
+    USE_PLAYWRIGHT  = os.getenv("USE_PLAYWRIGHT","1") == "1"  # default aan
+    FETCH_MODE      = (os.getenv("FETCH_MODE") or ("playwright" if USE_PLAYWRIGHT else "requests")).strip().lower()
+    FETCH_PATHS_FILE     = os.getenv("FETCH_PATHS_FILE", "fetch_paths.json")
+    HYBRID_REPROBE_EVERY = int(os.getenv("HYBRID_REPROBE_EVERY", "20"))
+    HEDGE_DELAY_SEC      = float(os.getenv("HEDGE_DELAY_SEC") or "1.5")
+    PAGE_CACHE_FILE = os.getenv("PAGE_CACHE_FILE", "page_cache.json")
+    LOGIN_HINTS_FILE = os.getenv("LOGIN_HINTS_FILE", "login_hints.json")
+
+    # lean page loading (Playwright)
+    BLOCK_RESOURCES      = os.getenv("BLOCK_RESOURCES", "1") == "1"
+    BLOCK_RESOURCE_TYPES = set(_csv_env("BLOCK_RESOURCE_TYPES", "image,media,font"))
+    BLOCK_URL_PATTERNS   = _csv_env("BLOCK_URL_PATTERNS",
+        "google-analytics.com,googletagmanager.com,doubleclick.net,facebook.net,hotjar.com,"
+        "clarity.ms,segment.io,cdn.cookielaw.org,/collect?")
+    ALLOW_URL_PATTERNS   = _csv_env("ALLOW_URL_PATTERNS")
+    READY_TIMEOUT_MS     = int(os.getenv("READY_TIMEOUT_MS", "5000"))
+
+    METRICS_FILE    = os.getenv("METRICS_FILE", "metrics.jsonl")
+    TRACE_FILE      = (os.getenv("TRACE_FILE") or "").strip()
+    PROFILE_CHECK   = os.getenv("PROFILE_CHECK", "0") == "1"
+    PROFILE_FILE    = os.getenv("PROFILE_FILE", "last_profile.prof")
+
+    # optionele overrides (Variables)
+    LOGIN_USERNAME_SELECTOR = os.getenv("LOGIN_USERNAME_SELECTOR")  # bv input[name="email"]
+    LOGIN_PASSWORD_SELECTOR = os.getenv("LOGIN_PASSWORD_SELECTOR")  # bv input[name="password"]
+    LOGIN_SUBMIT_SELECTOR   = os.getenv("LOGIN_SUBMIT_SELECTOR")    # bv button[type="submit"]
+
+    EXTRA_FIELDS = _json_env("EXTRA_FIELDS_JSON", {})
+
+    # sessie-cache (gedeeld door Playwright en requests)
+    SESSION_FILE    = os.getenv("SESSION_FILE", "session.json")
+    SESSION_TTL_SEC = int(os.getenv("SESSION_TTL_SEC", "21600"))
+
+    # daemon
+    MIN_SLEEP_SEC   = int(os.getenv("MIN_SLEEP_SEC", "60"))
+    MAX_SLEEP_SEC   = int(os.getenv("MAX_SLEEP_SEC", "300"))
+    QUIET_TZ        = os.getenv("QUIET_TZ", "Europe/Amsterdam")
+    QUIET_START     = (os.getenv("QUIET_START") or "").strip()   # bv "00:07"
+    QUIET_END       = (os.getenv("QUIET_END") or "").strip()     # bv "06:28"
+    DAEMON_DURATION_SEC    = int(os.getenv("DAEMON_DURATION_SEC", "19800"))
+    DAEMON_MAX_CHECKS      = int(os.getenv("DAEMON_MAX_CHECKS", "0") or 0)
+    BROWSER_RECYCLE_CHECKS = int(os.getenv("BROWSER_RECYCLE_CHECKS", "50"))
+    DAEMON_GIT_COMMIT      = os.getenv("DAEMON_GIT_COMMIT", "1") == "1"
+    TEST_MODE       = (os.getenv("TEST_MODE") or "0").lower() in ("1","true","yes")
+    GIT_SYNC_INTERVAL_SEC  = int(os.getenv("GIT_SYNC_INTERVAL_SEC", "600"))
+
+    # pre-warmed worker
+    WORKER_SOCKET   = os.getenv("WORKER_SOCKET", ".checker.sock")
+    WORKER_IDLE_SEC = int(os.getenv("WORKER_IDLE_SEC", "900"))
+
+    for mod in (state_store, notifier, scheduler, snapshots):
+        mod.load_config()
+    key = (USER_AGENT, os.path.abspath(SESSION_FILE), SESSION_TTL_SEC, BLOCK_RESOURCES)
+    if _CLIENT_KEY["key"] not in (None, key):
+        print("Config changed → new HTTP session and browser context.")
+        reset_clients()
+    _CLIENT_KEY["key"] = key
+
+load_config()
+
+REQUIRED_ENV = ("LOGIN_URL","TARGET_URL","SITE_USERNAME","SITE_PASSWORD","TELEGRAM_BOT_TOKEN","TELEGRAM_CHAT_ID")
+
+# ====== tracing ======
+_TRACE = {"events": [], "all": []}   # events van de lopende check; all = alles voor TRACE_FILE
+TRACE_MAX_EVENTS = 20000
+
+@contextlib.contextmanager
+def phase(name):
+    """Tijd een fase van de check; resultaat komt in de TIMING-regel, metrics en TRACE_FILE."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _TRACE["events"].append((name, start, time.perf_counter(), threading.get_ident()))
+
+def trace_begin():
+    _TRACE["events"] = []
+
+def trace_summary():
+    """{fase: ms}, opgeteld per naam, in volgorde van eerste start."""
+    out = {}
+    for name, start, end, _ in sorted(_TRACE["events"], key=lambda e: e[1]):
+        out[name] = round(out.get(name, 0) + (end - start) * 1000, 1)
+    return out
+
+def trace_line(total_ms):
+    return f"TIMING total={total_ms:.0f}ms " + " ".join(f"{n}={ms:.0f}" for n, ms in trace_summary().items())
+
+def trace_export():
+    if not TRACE_FILE: return
+    pid = os.getpid()
+    _TRACE["all"] += [{"name": n, "ph": "X", "ts": round(a * 1e6), "dur": round((b - a) * 1e6),
+                       "pid": pid, "tid": tid} for n, a, b, tid in _TRACE["events"]]
+    del _TRACE["all"][:-TRACE_MAX_EVENTS]
+    try:
+        with open(TRACE_FILE,"w",encoding="utf-8") as f:
+            json.dump({"traceEvents": _TRACE["all"], "displayTimeUnit": "ms"}, f)
+    except Exception as e:
+        print(f"Trace write failed: {e}", file=sys.stderr)
+
+def write_profile(prof):
+    import pstats
+    try:
+        prof.dump_stats(PROFILE_FILE)
+        with open(os.path.splitext(PROFILE_FILE)[0] + ".txt","w",encoding="utf-8") as f:
+            pstats.Stats(prof, stream=f).sort_stats("cumulative").print_stats(40)
+        print(f"Profile saved: {PROFILE_FILE}")
+    except Exception as e:
+        print(f"Profile write failed: {e}", file=sys.stderr)
 
 # ====== helpers ======
 def send_telegram(text: str):
+    """Zet het bericht in de queue van notifier.py; versturen (met retries) gebeurt op de achtergrond."""
     if not TELEGRAM_TOKEN or not TELEGRAM_CHATID:
         print("Telegram not configured", file=sys.stderr)
         return
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    try:
-        requests.post(url, data={"chat_id": TELEGRAM_CHATID, "text": text}, timeout=20).raise_for_status()
-    except Exception as e:
-        print(f"Telegram error: {e}", file=sys.stderr)
+    with phase("telegram"):
+        notifier.get_notifier(TELEGRAM_TOKEN, TELEGRAM_API).send(TELEGRAM_CHATID, text)
+
+LOGIN_WORDS_RE = re.compile(r"wachtwoord|password|inloggen|aanmelden|login", re.I)
 
 def looks_like_login_page(html: str) -> bool:
-    lower = html.lower()
-    return any(w in lower for w in ("wachtwoord","password","inloggen","aanmelden","login",'type="password"'))
+    return LOGIN_WORDS_RE.search(html or "") is not None
 
-def url_checks(final_url: str) -> bool:
+def env_target():
+    """De single-target configuratie uit env, in hetzelfde formaat als een TARGETS_FILE-entry."""
+    return {"name": TARGET_NAME, "target_url": TARGET_URL, "login_url": LOGIN_URL,
+            "username": USERNAME, "password": PASSWORD, "text_to_find": TEXT_TO_FIND,
+            "confirm_text": CONFIRM_TEXT, "css_selector": CSS_SELECTOR, "slot_selector": SLOT_SELECTOR,
+            "expected_host": EXPECTED_HOST, "expected_path": EXPECTED_PATH}
+
+def url_checks(final_url: str, t=None) -> bool:
+    t = t or env_target()
+    exp_host, exp_path = t.get("expected_host") or "", t.get("expected_path") or ""
     ok = True
     host = (urlparse(final_url).hostname or "").lower()
-    if EXPECTED_HOST and host != EXPECTED_HOST.lower():
-        print(f"URL host mismatch: '{host}' vs '{EXPECTED_HOST}'", file=sys.stderr); ok = False
+    if exp_host and host != exp_host.lower():
+        print(f"URL host mismatch: '{host}' vs '{exp_host}'", file=sys.stderr); ok = False
     path = urlparse(final_url).path or ""
-    if ok and EXPECTED_PATH and EXPECTED_PATH not in path:
-        print(f"URL path mismatch: '{path}' mist '{EXPECTED_PATH}'", file=sys.stderr); ok = False
+    if ok and exp_path and exp_path not in path:
+        print(f"URL path mismatch: '{path}' mist '{exp_path}'", file=sys.stderr); ok = False
     return ok
 
+def login_candidates():
+    """Kandidaat-selectors voor gebruikersnaam, wachtwoord en submit (eerst eventuele overrides)."""
+    user_cands = [LOGIN_USERNAME_SELECTOR] if LOGIN_USERNAME_SELECTOR else []
+    user_cands += [
+        ':has(label:has-text("Emailadres")) input',
+        ':has(label:has-text("E-mail")) input',
+        'input[name="email"]','input[type="email"]','input[id*="email" i]',
+        'input[name="username"]','input[id*="user" i]','input[type="text"]'
+    ]
+    pass_cands = [LOGIN_PASSWORD_SELECTOR] if LOGIN_PASSWORD_SELECTOR else []
+    pass_cands += [
+        ':has(label:has-text("Wachtwoord")) input',
+        'input[name="password"]','input[type="password"]','input[id*="pass" i]'
+    ]
+    submit_cands = [LOGIN_SUBMIT_SELECTOR] if LOGIN_SUBMIT_SELECTOR else []
+    submit_cands += [
+        'button[type="submit"]','input[type="submit"]',
+        'button:has-text("Inloggen")','text=Inloggen'
+    ]
+    return user_cands, pass_cands, submit_cands
+
+# ====== geleerde login-selectors ======
+SUBMIT_JS = """
+    () => {
+      const btn = document.querySelector('button[type="submit"], input[type="submit"]');
+      const form = (btn && btn.closest('form')) || document.querySelector('form');
+      if (form && form.requestSubmit) form.requestSubmit();
+      else if (form) form.submit();
+    }
+"""
+
+def load_login_hint(login_url):
+    """{"user", "pass", "submit"} die de vorige keer werkten voor deze login_url, of {}."""
+    try:
+        with open(LOGIN_HINTS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f).get(login_url) or {}
+    except Exception:
+        return {}
+
+def _write_login_hints(update):
+    try:
+        with open(LOGIN_HINTS_FILE, "r", encoding="utf-8") as f:
+            hints = json.load(f)
+    except Exception:
+        hints = {}
+    update(hints)
+    try:
+        with open(LOGIN_HINTS_FILE, "w", encoding="utf-8") as f:
+            json.dump(hints, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"Login hints write failed: {e}", file=sys.stderr)
+
+def save_login_hint(login_url, user_sel, pass_sel, submit):
+    hint = {"user": user_sel, "pass": pass_sel, "submit": submit}
+    if load_login_hint(login_url) != hint:
+        _write_login_hints(lambda h: h.__setitem__(login_url, hint))
+
+def forget_login_hint(login_url):
+    if load_login_hint(login_url):
+        print("Login hint did not work; next login probes all candidates.")
+        _write_login_hints(lambda h: h.pop(login_url, None))
+
+def prefer(cands, sel):
+    """Kandidaten met de geleerde selector vooraan (rest blijft fallback)."""
+    return ([sel] + [c for c in cands if c != sel]) if sel else list(cands)
+
 def normalize(s: str) -> str:
     return re.sub(r"\s+", " ", (s or "")).strip().casefold()
 
@@ -97,42 +331,277 @@ def find_csrf(html: str):
         if m: return m.group(1)
     return None
 
-def save_snapshot_files(html: str, png_exists: bool):
-    if not DEBUG_SNAPSHOT: return
+def take_snapshot(reason, res, m):
+    """Snapshot in de ring buffer van snapshots.py; de screenshot (als de browser-pagina nog open
+    is) wordt hier genomen, comprimeren en schrijven gebeurt in de achtergrond."""
+    if not DEBUG_SNAPSHOT or not reason:
+        return
+    jpeg = None
+    if res.get("shot"):
+        try:
+            with phase("snapshot"): jpeg = res["shot"]()
+        except Exception as e:
+            print(f"Screenshot failed: {e}", file=sys.stderr)
+    snapshots.get_writer().submit({"reason": reason, "target": TARGET_NAME, "verdict": m["verdict"],
+                                   "available": m["available"], "path": res.get("path"),
+                                   "url": res.get("url")}, res.get("html"), jpeg)
+
+def content_hash(s: str) -> str:
+    return hashlib.sha1((s or "").encode("utf-8", "replace")).hexdigest()
+
+# ====== page cache (conditional requests / hash short-circuit) ======
+# Een entry geldt alleen voor de extractie-instellingen waarmee hij gemaakt is: na een andere
+# CSS_SELECTOR/TEXT_TO_FIND/... zegt een 304 of gelijke hash niets over de nieuwe verdict.
+EXTRACTION_KEYS = ("text_to_find", "confirm_text", "css_selector", "slot_selector", "expected_host", "expected_path")
+
+def extraction_hash() -> str:
+    t = env_target()
+    return content_hash(json.dumps([t.get(k) or "" for k in EXTRACTION_KEYS]))
+
+def load_page_cache():
+    try:
+        with open(PAGE_CACHE_FILE,"r",encoding="utf-8") as f:
+            entry = json.load(f).get(TARGET_URL) or {}
+    except Exception:
+        return {}
+    return entry if entry.get("config") == extraction_hash() else {}
+
+def save_page_cache(entry):
+    try:
+        with open(PAGE_CACHE_FILE,"r",encoding="utf-8") as f:
+            allc = json.load(f)
+    except Exception:
+        allc = {}
+    allc[TARGET_URL] = dict(entry, config=extraction_hash()) if entry else {}
+    try:
+        with open(PAGE_CACHE_FILE,"w",encoding="utf-8") as f:
+            json.dump(allc, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"Page cache write failed: {e}", file=sys.stderr)
+
+# ====== session cache ======
+# Playwright storage_state-formaat: {"cookies": [...], "origins": [...]}, plus "saved_at".
+def load_session():
+    if SESSION_TTL_SEC <= 0: return None
+    try:
+        with open(SESSION_FILE,"r",encoding="utf-8") as f:
+            st = json.load(f)
+    except Exception:
+        return None
+    age = time.time() - float(st.get("saved_at") or 0)
+    if age > SESSION_TTL_SEC:
+        print(f"Session cache expired ({int(age)}s old).")
+        return None
+    return {"cookies": st.get("cookies") or [], "origins": st.get("origins") or []}
+
+def save_session(storage_state):
+    if SESSION_TTL_SEC <= 0: return
+    st = {"saved_at": time.time(), "cookies": storage_state.get("cookies") or [],
+          "origins": storage_state.get("origins") or []}
     try:
-        with open("last_response.html","w",encoding="utf-8") as f:
-            f.write(html or "")
-        print("SNAPSHOT_SAVED=1")
-        if png_exists:
-            print("SNAPSHOT_PNG_PRESENT=1")
+        tmp = SESSION_FILE + ".tmp"
+        with open(tmp,"w",encoding="utf-8") as f:
+            json.dump(st, f)
+        os.replace(tmp, SESSION_FILE)
+        print(f"Session cached ({len(st['cookies'])} cookies).")
+        if _HTTP["session"] is not None:
+            cookies_to_jar(_HTTP["session"].cookies, st["cookies"])
     except Exception as e:
-        print(f"Snapshot failed: {e}", file=sys.stderr)
+        print(f"Session cache write failed: {e}", file=sys.stderr)
+
+def invalidate_session():
+    try:
+        os.remove(SESSION_FILE)
+        print("Session cache invalidated.")
+    except FileNotFoundError:
+        pass
+    if _PW["context"] is not None:
+        try: _PW["context"].clear_cookies()
+        except Exception: pass
+
+def cookies_to_jar(jar, cookies):
+    from requests.cookies import create_cookie
+    for c in cookies:
+        exp = c.get("expires")
+        jar.set_cookie(create_cookie(
+            c["name"], c["value"], domain=c.get("domain",""), path=c.get("path","/"),
+            secure=bool(c.get("secure")), expires=int(exp) if exp and exp > 0 else None,
+            rest={"HttpOnly": None} if c.get("httpOnly") else {}))
+
+def jar_to_cookies(jar):
+    return [{"name": c.name, "value": c.value, "domain": c.domain, "path": c.path or "/",
+             "expires": c.expires if c.expires else -1, "httpOnly": c.has_nonstandard_attr("HttpOnly"),
+             "secure": bool(c.secure), "sameSite": "Lax"} for c in jar]
+
+# ====== requests (gepoolde sessie) ======
+_HTTP = {"session": None}
+
+def http_session():
+    """Eén keep-alive sessie per proces, met cookies uit de sessie-cache (ook die van de browser)."""
+    if _HTTP["session"] is None:
+        import requests
+        s = requests.Session()
+        s.headers.update({"User-Agent": USER_AGENT})
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        s.mount("https://", adapter); s.mount("http://", adapter)
+        cached = load_session()
+        if cached:
+            cookies_to_jar(s.cookies, cached["cookies"])
+        _HTTP["session"] = s
+    return _HTTP["session"]
 
-# ====== requests fallback ======
 def fetch_via_requests():
+    import requests
     def safe_get(sess, url):
         r = sess.get(url, timeout=25, allow_redirects=True); r.raise_for_status(); return r
-    with requests.Session() as s:
-        s.headers.update({"User-Agent": USER_AGENT})
-        try:
-            r = safe_get(s, TARGET_URL)
-        except requests.HTTPError as e:
-            if e.response is not None and e.response.status_code in (401,403):
-                r = s.get(LOGIN_URL, timeout=25); r.raise_for_status()
+    s = http_session()
+    cache = load_page_cache()
+    cond = {}
+    if cache.get("etag"): cond["If-None-Match"] = cache["etag"]
+    if cache.get("last_modified"): cond["If-Modified-Since"] = cache["last_modified"]
+    nbytes, logged_in = 0, False
+    try:
+        with phase("http.get"): r = s.get(TARGET_URL, timeout=25, allow_redirects=True, headers=cond)
+        nbytes += len(r.content)
+        r.raise_for_status()
+        if r.status_code == 304:
+            return {"html": None, "url": r.url, "selected_text": "", "shot": None, "path": "requests",
+                    "unchanged": "304 Not Modified", "bytes": nbytes, "login": False}
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code in (401,403):
+            logged_in = True
+            with phase("http.login"):
+                r = s.get(LOGIN_URL, timeout=25); r.raise_for_status(); nbytes += len(r.content)
                 token = find_csrf(r.text)
                 fields = dict(EXTRA_FIELDS)
                 if token and not any(k in fields for k in ("csrf_token","_token","__requestverificationtoken","csrfmiddlewaretoken")):
                     fields["csrf_token"] = token
                 payload = {USERNAME_FIELD: USERNAME, PASSWORD_FIELD: PASSWORD, **fields}
-                r = s.post(LOGIN_URL, data=payload, timeout=25); r.raise_for_status()
-                r = safe_get(s, TARGET_URL)
-            else:
-                raise
-        return r.text, r.url
+                r = s.post(LOGIN_URL, data=payload, timeout=25); r.raise_for_status(); nbytes += len(r.content)
+            with phase("http.get"): r = safe_get(s, TARGET_URL)
+            nbytes += len(r.content)
+            if not looks_like_login_page(r.text):
+                save_session({"cookies": jar_to_cookies(s.cookies),
+                              "origins": (load_session() or {}).get("origins", [])})
+        else:
+            raise
+    return {"html": r.text, "url": r.url, "selected_text": "", "shot": None, "path": "requests",
+            "etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified"),
+            "bytes": nbytes, "login": logged_in}
+
+# ====== Playwright: lean loading ======
+def should_block(resource_type: str, url: str) -> bool:
+    if any(p in url for p in ALLOW_URL_PATTERNS): return False
+    return resource_type in BLOCK_RESOURCE_TYPES or any(p in url for p in BLOCK_URL_PATTERNS)
+
+def _route_handler(route):
+    req = route.request
+    try:
+        if should_block(req.resource_type, req.url): route.abort()
+        else: route.continue_()
+    except Exception:
+        pass  # pagina al weg
+
+def ready_script(t=None):
+    """JS-predicaat voor wait_for_function: de marker staat in de body-tekst. Alleen de marker:
+    CONFIRM_TEXT is kop-tekst van de shell en staat er al vóór de dagen (XHR) geladen zijn."""
+    t = t or env_target()
+    needles = [n for n in [normalize(t.get("text_to_find") or TEXT_TO_FIND)] if n]
+    return ("(needles) => { const b = document.body; if (!b) return false;"
+            " const s = b.innerText.replace(/\\s+/g,' ').toLowerCase();"
+            " return needles.some(n => s.includes(n)); }"), needles
+
+# loginpagina verlaten: andere URL dan vóór de submit, of het wachtwoordveld is weg. Niet op "login"
+# in de URL letten: LOGIN_URL kan ook /auth/signin o.i.d. zijn.
+LOGIN_LEFT_JS = """(start) => location.href !== start || !document.querySelector('input[type="password"]')"""
+LEARNED_SUBMIT_WAIT_MS = 5000   # zo lang mag een geleerde submit-strategie doen over het verlaten van de loginpagina
+
+# ====== Playwright browser (blijft warm in daemon-modus) ======
+_PW = {"pw": None, "browser": None, "context": None, "checks": 0, "page": None}
+
+def browser_context():
+    if _PW["context"] is None:
+        from playwright.sync_api import sync_playwright
+        if _PW["pw"] is None:
+            _PW["pw"] = sync_playwright().start()
+        _PW["browser"] = _PW["pw"].chromium.launch(headless=True)
+        cached = load_session()
+        _PW["context"] = _PW["browser"].new_context(user_agent=USER_AGENT, storage_state=cached)
+        if BLOCK_RESOURCES:
+            _PW["context"].route("**/*", _route_handler)
+        if cached:
+            print(f"Session cache loaded ({len(cached['cookies'])} cookies).")
+        _PW["checks"] = 0
+        print("Browser launched.")
+    return _PW["context"]
+
+def release_page():
+    """Sluit de pagina die fetch_via_playwright open liet voor een eventuele snapshot."""
+    page, _PW["page"] = _PW["page"], None
+    if page is not None:
+        try: page.close()
+        except Exception: pass
+
+def reset_clients():
+    """HTTP-sessie en browser weggooien; de volgende fetch bouwt ze opnieuw op met de huidige config."""
+    session, _HTTP["session"] = _HTTP["session"], None
+    if session is not None:
+        session.close()
+    close_browser()
+
+def close_browser(stop=False):
+    """Sluit browser (recycle); met stop=True ook de Playwright-driver."""
+    release_page()
+    browser, pw = _PW["browser"], _PW["pw"]
+    _PW.update(browser=None, context=None, checks=0)
+    if browser is not None:
+        try: browser.close()
+        except Exception as e: print(f"Browser close failed: {e}", file=sys.stderr)
+    if stop and pw is not None:
+        _PW["pw"] = None
+        try: pw.stop()
+        except Exception: pass
 
 # ====== Playwright (JS) ======
-def fetch_via_playwright():
-    from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
+class FetchCancelled(Exception):
+    """De browser-fetch is afgebroken omdat het andere pad (hedged) al beslist heeft."""
+
+CANCEL_SLICE_MS = 250   # hedged: zo vaak kijken lange wachttijden naar `cancel`
+
+def fetch_via_playwright(cancel=None):
+    """
+    `cancel`: optioneel threading.Event (FETCH_MODE=hedged). De sync-API is thread-gebonden, dus
+    de browser kan niet van buitenaf gestopt worden; daarom wacht de browser met `cancel` in stukjes
+    van CANCEL_SLICE_MS en kijkt daartussen. Niet af te breken: een navigatie tot de eerste
+    response-bytes (commit) en korte acties (fill/click, ≤ 4 s).
+    """
+    from playwright.sync_api import TimeoutError as PWTimeout
+
+    def checkpoint():
+        if cancel is not None and cancel.is_set():
+            raise FetchCancelled()
+
+    def sliced(wait, timeout_ms):
+        """wait(timeout_ms) in stukjes met checkpoint() ertussen; PWTimeout na timeout_ms."""
+        if cancel is None:
+            return wait(timeout_ms)
+        deadline = time.monotonic() + timeout_ms / 1000
+        while True:
+            checkpoint()
+            left = (deadline - time.monotonic()) * 1000
+            if left <= 0:
+                raise PWTimeout(f"Timeout {timeout_ms}ms exceeded.")
+            try:
+                return wait(min(CANCEL_SLICE_MS, left))
+            except PWTimeout:
+                if time.monotonic() >= deadline: raise
+
+    def goto(page, url, timeout):
+        if cancel is None:
+            return page.goto(url, wait_until="domcontentloaded", timeout=timeout)
+        resp = page.goto(url, wait_until="commit", timeout=timeout)
+        sliced(lambda ms: page.wait_for_load_state("domcontentloaded", timeout=ms), timeout)
+        return resp
 
     def first_visible(page, selector):
         loc = page.locator(selector)
@@ -146,10 +615,18 @@ def fetch_via_playwright():
                 pass
         return None
 
-    def fill_visible(page, selectors, value, label):
+    def fill_visible(page, selectors, value, label, known=None):
         for sel in selectors:
             el = first_visible(page, sel)
             if el:
+                if sel == known:
+                    # selector heeft eerder gewerkt: in één keer vullen i.p.v. teken voor teken
+                    try:
+                        el.fill(value, timeout=4000)
+                        print(f"Filled {label}: {sel}")
+                        return el, sel
+                    except Exception:
+                        pass
                 try: el.click(timeout=1500)
                 except Exception: pass
                 try: el.fill("", timeout=1500)
@@ -160,6 +637,13 @@ def fetch_via_playwright():
                 return el, sel
         return None, None
 
+    def left_login_page(page, start, timeout):
+        try:
+            page.wait_for_function(LOGIN_LEFT_JS, arg=start, timeout=timeout)
+            return True
+        except Exception:
+            return False
+
     def submit_enabled(page):
         try:
             btn = page.locator('button[type="submit"], input[type="submit"]').first
@@ -167,207 +651,962 @@ def fetch_via_playwright():
         except Exception:
             return False
 
-    png_written = False
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(user_agent=USER_AGENT)
-        page = context.new_page()
+    keep_page = False
+    with phase("pw.launch"): context = browser_context()
+    _PW["checks"] += 1
+    page = context.new_page()
+    received = [0]
+    def on_response(resp):
+        try: received[0] += int(resp.headers.get("content-length") or 0)
+        except Exception: pass
+    page.on("response", on_response)
+    try:
+        checkpoint()
 
         # 1) Ga altijd eerst naar TARGET
-        page.goto(TARGET_URL, wait_until="domcontentloaded", timeout=60000)
+        with phase("pw.goto"): resp = goto(page, TARGET_URL, 60000)
+        if resp is not None and resp.status in (429, 503):
+            raise scheduler.Throttled(resp.status, resp.headers.get("retry-after"))
+        checkpoint()
 
         # 2) Login nodig?
         need_login = ("login" in page.url.lower()) or (page.locator('input[type="password"]').count() > 0)
         if need_login:
-            print("Login required → opening LOGIN_URL …")
-            page.goto(LOGIN_URL, wait_until="domcontentloaded", timeout=60000)
-
-            # Kandidaten (eerst eventuele overrides)
-            user_cands = [LOGIN_USERNAME_SELECTOR] if LOGIN_USERNAME_SELECTOR else []
-            user_cands += [
-                ':has(label:has-text("Emailadres")) input',
-                ':has(label:has-text("E-mail")) input',
-                'input[name="email"]','input[type="email"]','input[id*="email" i]',
-                'input[name="username"]','input[id*="user" i]','input[type="text"]'
-            ]
-            pass_cands = [LOGIN_PASSWORD_SELECTOR] if LOGIN_PASSWORD_SELECTOR else []
-            pass_cands += [
-                ':has(label:has-text("Wachtwoord")) input',
-                'input[name="password"]','input[type="password"]','input[id*="pass" i]'
-            ]
-            submit_cands = [LOGIN_SUBMIT_SELECTOR] if LOGIN_SUBMIT_SELECTOR else []
-            submit_cands += [
-                'button[type="submit"]','input[type="submit"]',
-                'button:has-text("Inloggen")','text=Inloggen'
-            ]
-
-            pel, _ = None, None
-            uel, _ = fill_visible(page, user_cands, USERNAME, "email/username")
-            if uel:
-                pel, _ = fill_visible(page, pass_cands, PASSWORD, "password")
-            if not uel or not pel:
-                raise RuntimeError("Kon zichtbare velden niet vinden.")
-
-            # Forceer input/change/blur events voor validatie
-            try:
-                page.evaluate("""
-                    (emailSel, passSel) => {
-                      const sel = (q) => document.querySelector(q);
-                      const e = sel(emailSel) || sel('input[name="email"]');
-                      const p = sel(passSel)  || sel('input[name="password"]');
-                      for (const el of [e,p]) {
-                        if (!el) continue;
-                        el.dispatchEvent(new Event('input', {bubbles:true}));
-                        el.dispatchEvent(new Event('change',{bubbles:true}));
-                        el.blur();
-                      }
-                    }
-                """, LOGIN_USERNAME_SELECTOR or 'input[name="email"]',
-                     LOGIN_PASSWORD_SELECTOR or 'input[name="password"]')
-                time.sleep(0.3)
-            except Exception:
-                pass
+            with phase("pw.login"):
+                print("Login required → opening LOGIN_URL …")
+                with phase("pw.goto_login"): goto(page, LOGIN_URL, 60000)
+                checkpoint()
 
-            # Probeer click als enabled → anders Enter → anders requestSubmit()
-            clicked = False
-            if submit_enabled(page):
-                try:
-                    page.locator('button[type="submit"], input[type="submit"]').first.click(timeout=3000)
-                    print("Clicked enabled submit")
-                    clicked = True
-                except Exception as e:
-                    print(f"Click enabled submit failed: {e}")
+                user_cands, pass_cands, _ = login_candidates()
+                hint = load_login_hint(LOGIN_URL)
 
-            if not clicked:
-                try:
-                    page.keyboard.press("Enter")
-                    print("Pressed Enter to submit.")
-                    time.sleep(0.4)
-                    clicked = True
-                except Exception:
-                    pass
+                with phase("pw.login.fill"):
+                    pel, psel = None, None
+                    uel, usel = fill_visible(page, prefer(user_cands, hint.get("user")), USERNAME,
+                                             "email/username", known=hint.get("user"))
+                    if uel:
+                        pel, psel = fill_visible(page, prefer(pass_cands, hint.get("pass")), PASSWORD,
+                                                 "password", known=hint.get("pass"))
+                    if not uel or not pel:
+                        raise RuntimeError("Kon zichtbare velden niet vinden.")
+                checkpoint()
 
-            if not submit_enabled(page):
-                try:
-                    page.evaluate("""
-                        () => {
-                          const btn = document.querySelector('button[type="submit"], input[type="submit"]');
-                          const form = (btn && btn.closest('form')) || document.querySelector('form');
-                          if (form && form.requestSubmit) form.requestSubmit();
-                          else if (form) form.submit();
-                        }
-                    """)
-                    print("Forced form submit via requestSubmit()")
-                except Exception as e:
-                    print("requestSubmit() failed:", e)
+                with phase("pw.login.submit"):
+                    # Forceer input/change/blur events voor validatie
+                    for el in (uel, pel):
+                        try:
+                            el.evaluate("""el => {
+                                el.dispatchEvent(new Event('input', {bubbles:true}));
+                                el.dispatchEvent(new Event('change',{bubbles:true}));
+                                el.blur();
+                            }""")
+                        except Exception:
+                            pass
 
-            try:
-                page.wait_for_load_state("networkidle", timeout=15000)
-            except PWTimeout:
-                pass
+                    left_login, strategy = False, None
+                    start_url = page.url   # "login klaar" = weg van deze URL of geen wachtwoordveld meer
+                    learned = hint.get("submit")
+                    if learned:
+                        # geleerde strategie eerst; verlaat die de loginpagina niet, dan alsnog de volledige probe
+                        try:
+                            if learned == "click":
+                                page.locator('button[type="submit"], input[type="submit"]').first.click(timeout=3000)
+                            elif learned == "enter":
+                                page.keyboard.press("Enter")
+                            else:
+                                page.evaluate(SUBMIT_JS)
+                            print(f"Submitted via learned strategy: {learned}")
+                            left_login = left_login_page(page, start_url, LEARNED_SUBMIT_WAIT_MS)
+                        except Exception as e:
+                            print(f"Learned submit ({learned}) failed: {e}")
+                        if left_login:
+                            strategy = learned
+                        else:
+                            print("Learned submit did not leave the login page → full probe.")
+                    if not left_login:
+                        # Probeer click als enabled → anders Enter → anders requestSubmit()
+                        if submit_enabled(page):
+                            try:
+                                page.locator('button[type="submit"], input[type="submit"]').first.click(timeout=3000)
+                                print("Clicked enabled submit")
+                                strategy = "click"
+                            except Exception as e:
+                                print(f"Click enabled submit failed: {e}")
 
-            if DEBUG_SNAPSHOT:
-                try:
-                    page.screenshot(path="after_submit.png", full_page=True)
-                    print("Screenshot saved: after_submit.png")
-                except Exception:
-                    pass
+                        if not strategy:
+                            try:
+                                page.keyboard.press("Enter")
+                                print("Pressed Enter to submit.")
+                                strategy = "enter"
+                            except Exception:
+                                pass
 
-            # 1x terug naar TARGET (geen loop)
-            page.goto(TARGET_URL, wait_until="domcontentloaded", timeout=30000)
+                        # navigeert de submit al? dan geen requestSubmit() meer nodig
+                        left_login = left_login_page(page, start_url, 1500)
+
+                        if not left_login and not submit_enabled(page):
+                            try:
+                                page.evaluate(SUBMIT_JS)
+                                print("Forced form submit via requestSubmit()")
+                                strategy = "requestSubmit"
+                            except Exception as e:
+                                print("requestSubmit() failed:", e)
+
+                checkpoint()
+                with phase("pw.login.wait"):
+                    # wachten tot de login voorbij is (andere URL of wachtwoordveld weg), niet op networkidle
+                    if not left_login:
+                        try:
+                            sliced(lambda ms: page.wait_for_function(LOGIN_LEFT_JS, arg=start_url, timeout=ms), 15000)
+                        except PWTimeout:
+                            print("Login page not left within 15s.")
+
+                # 1x terug naar TARGET (geen loop)
+                with phase("pw.goto"): goto(page, TARGET_URL, 30000)
+                if "login" not in page.url.lower() and page.locator('input[type="password"]').count() == 0:
+                    save_session(context.storage_state())
+                    if strategy:
+                        save_login_hint(LOGIN_URL, usel, psel, strategy)
+                elif hint:
+                    forget_login_hint(LOGIN_URL)
 
         # 3) Content ophalen
+        checkpoint()
         sel_text = ""
-        if CSS_SELECTOR:
-            try:
-                page.wait_for_selector(CSS_SELECTOR, timeout=15000)
-                el = page.locator(CSS_SELECTOR).first
-                if el and el.is_visible():
-                    sel_text = el.text_content() or ""
-                    print(f"Captured CSS_SELECTOR content (len={len(sel_text)}).")
-            except Exception:
-                print("CSS_SELECTOR not found within timeout.")
+        with phase("pw.wait_ready"):
+            if CSS_SELECTOR:
+                try:
+                    sliced(lambda ms: page.wait_for_selector(CSS_SELECTOR, timeout=ms), 15000)
+                    el = page.locator(CSS_SELECTOR).first
+                    if el and el.is_visible():
+                        sel_text = el.text_content() or ""
+                        print(f"Captured CSS_SELECTOR content (len={len(sel_text)}).")
+                except FetchCancelled:
+                    raise
+                except Exception:
+                    print("CSS_SELECTOR not found within timeout.")
+            elif READY_TIMEOUT_MS > 0:
+                js, needles = ready_script()
+                try:
+                    sliced(lambda ms: page.wait_for_function(js, arg=needles, timeout=ms), READY_TIMEOUT_MS)
+                except FetchCancelled:
+                    raise
+                except Exception:
+                    print("Marker not rendered within READY_TIMEOUT_MS.")
 
-        html = page.content()
+        checkpoint()
+        with phase("pw.content"): html = page.content()
         final_url = page.url
 
+        shot = None
         if DEBUG_SNAPSHOT:
-            try:
-                page.screenshot(path="last_response.png", full_page=True)
-                png_written = True
-                print("Screenshot saved: last_response.png")
-            except Exception as e:
-                print(f"Screenshot failed: {e}", file=sys.stderr)
+            # pagina open laten tot de check weet of er een snapshot nodig is (release_page)
+            keep_page, _PW["page"] = True, page
+            shot = lambda: page.screenshot(type="jpeg", quality=snapshots.SNAPSHOT_JPEG_QUALITY, full_page=True)
 
-        browser.close()
-        return html, final_url, sel_text, png_written
+        return {"html": html, "url": final_url, "selected_text": sel_text, "shot": shot,
+                "path": "playwright", "login": need_login,
+                "bytes": max(received[0], len(html.encode("utf-8", "replace")))}
+    finally:
+        if not keep_page:
+            try: page.close()
+            except Exception: pass
+
+# ====== hybride fetch ======
+def http_decisive(res) -> bool:
+    """Is de HTTP-respons goed genoeg om zonder browser te beslissen?"""
+    if res.get("unchanged"):
+        return True
+    v = res["eval"] = evaluate(res["html"], res["url"], res["selected_text"])
+    if v["verdict"] != "ok":
+        print(f"HTTP probe: {v['verdict']}."); return False
+    # "beschikbaar" betekent alleen dat de marker ontbreekt; dat is pas bewijs als de regio er
+    # server-side al staat. CONFIRM_TEXT (koptekst van de shell) zegt daar niets over.
+    if v["available"]:
+        if not CSS_SELECTOR:
+            print(f"HTTP probe: '{TEXT_TO_FIND}' ontbreekt (JS-rendered?)."); return False
+        if not v["region"]:
+            print(f"HTTP probe: regio '{CSS_SELECTOR}' ontbreekt of is leeg (JS-rendered?)."); return False
+    return True
+
+def load_fetch_paths():
+    try:
+        with open(FETCH_PATHS_FILE,"r",encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def save_fetch_paths(paths):
+    try:
+        with open(FETCH_PATHS_FILE,"w",encoding="utf-8") as f:
+            json.dump(paths, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"Fetch path cache write failed: {e}", file=sys.stderr)
+
+def fetch_adaptive():
+    """HTTP eerst, browser alleen als nodig; onthoudt per target welk pad werkte."""
+    paths = load_fetch_paths()
+    rec = paths.get(TARGET_URL) or {}
+    if rec.get("path") == "playwright" and rec.get("since_probe", 0) < HYBRID_REPROBE_EVERY:
+        rec["since_probe"] = rec.get("since_probe", 0) + 1
+        res = fetch_via_playwright()
+    else:
+        res = {}
+        try:
+            res = fetch_via_requests()
+            with phase("parse"): ok = http_decisive(res)
+        except Exception as e:
+            if scheduler.throttle_info(e)[0]: raise   # 429/503: afremmen, niet naar de browser
+            print(f"HTTP probe failed: {e}", file=sys.stderr)
+            ok = False
+        if ok:
+            rec = {"path": "requests", "since_probe": 0}
+        else:
+            print("Escalating to Playwright …")
+            probe_bytes = res.get("bytes", 0)
+            res = fetch_via_playwright()
+            res["bytes"] = res.get("bytes", 0) + probe_bytes
+            rec = {"path": "playwright", "since_probe": 0}
+    paths[TARGET_URL] = rec
+    save_fetch_paths(paths)
+    print(f"Fetch path: {res['path']}")
+    return res
+
+_HEDGE = {"thread": None}
+
+def fetch_hedged():
+    """
+    HTTP in een worker-thread; is die na HEDGE_DELAY_SEC niet beslissend, dan start de browser
+    (hoofdthread, want de sync-API is thread-gebonden). Het eerste beslissende resultaat wint:
+    wint HTTP, dan stopt de browser binnen CANCEL_SLICE_MS zolang hij wacht (een navigatie pas
+    na commit; zie fetch_via_playwright); wint de browser, dan wordt het HTTP-resultaat genegeerd.
+    Een 429/503 op de HTTP-probe stopt de browser ook en wordt doorgegooid (zie scheduler.throttle_info).
+    """
+    prev = _HEDGE["thread"]
+    if prev is not None and prev.is_alive():
+        prev.join(30)   # niet twee probes tegelijk op dezelfde sessie
+    cancel, done, box = threading.Event(), threading.Event(), {"ok": False}
+
+    def probe():
+        try:
+            res = fetch_via_requests()
+            with phase("parse"): ok = http_decisive(res)
+            box.update(res=res, ok=ok)
+            if ok: cancel.set()
+        except Exception as e:
+            if scheduler.throttle_info(e)[0]:
+                box["throttled"] = e; cancel.set()
+            else:
+                print(f"HTTP probe failed: {e}", file=sys.stderr)
+        finally:
+            done.set()
+
+    th = threading.Thread(target=probe, name="hedge-http", daemon=True)
+    _HEDGE["thread"] = th
+    th.start()
+    if done.wait(HEDGE_DELAY_SEC) and box["ok"]:
+        print("Hedge: HTTP decisive, no browser needed.")
+        return box["res"]
+    if box.get("throttled"): raise box["throttled"]
+    print("Hedge: HTTP not decisive → browser." if done.is_set()
+          else f"Hedge: HTTP undecided after {HEDGE_DELAY_SEC}s → starting browser in parallel …")
+
+    try:
+        res = fetch_via_playwright(cancel)
+    except FetchCancelled:
+        if box.get("throttled"): raise box["throttled"]
+        print("Hedge: HTTP won; browser cancelled.")
+        return box["res"]
+    except Exception as e:
+        done.wait(30)
+        if box.get("throttled"): raise box["throttled"]
+        if not box["ok"]: raise
+        print(f"Hedge: browser failed ({e}); using HTTP result.")
+        return box["res"]
+    if box.get("throttled"): raise box["throttled"]
+    with phase("parse"): res["eval"] = evaluate(res["html"], res["url"], res["selected_text"])
+    if res["eval"]["verdict"] != "ok":
+        done.wait(30)   # browser niet beslissend: HTTP krijgt nog een kans
+        if box.get("throttled"): raise box["throttled"]
+        if box["ok"]:
+            print("Hedge: HTTP won (browser not decisive).")
+            return box["res"]
+    elif not box["ok"]:
+        print("Hedge: browser won.")
+    res["bytes"] = res.get("bytes", 0) + (box.get("res") or {}).get("bytes", 0)
+    return res
+
+def fetch_page():
+    if FETCH_MODE == "auto":
+        return fetch_adaptive()
+    if FETCH_MODE == "hedged":
+        return fetch_hedged()
+    if FETCH_MODE == "requests":
+        return fetch_via_requests()
+    return fetch_via_playwright()
 
 # ====== extract & state ======
 def extract_relevant_text(html: str) -> str:
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html, "html.parser")
     return soup.get_text(separator=" ", strip=True)
 
-def load_state():
-    try:
-        with open("state.json","r",encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {"available": None}
+# Eenvoudige CSS-selectors (tag, #id, .class, [attr], [attr=val], descendant) matchen we zelf
+# tijdens het streamen; al het andere (:has, >, +, ...) gaat via BeautifulSoup.select.
+_SIMPLE_SEL_RE = re.compile(r"^(?:[\w-]+|\*)?(?:[#.][\w-]+|\[[\w-]+(?:=[\"']?[^\"'\]]*[\"']?)?\])*$")
+_SEL_PART_RE = re.compile(r"([#.])([\w-]+)|\[([\w-]+)(?:=[\"']?([^\"'\]]*)[\"']?)?\]")
+VOID_TAGS = {"area","base","br","col","embed","hr","img","input","link","meta","param","source","track","wbr"}
+# eindtags die HTML mag weglaten: <li>a<li>b sluit de eerste li (tot aan de omringende lijst/tabel)
+IMPLIED_END = {"li": ("li",), "option": ("option",), "optgroup": ("option", "optgroup"),
+               "tr": ("tr", "td", "th"), "td": ("td", "th"), "th": ("td", "th"),
+               "dt": ("dt", "dd"), "dd": ("dt", "dd")}
+IMPLIED_SCOPE = {"ul", "ol", "menu", "dl", "select", "datalist", "table", "thead", "tbody", "tfoot"}
+SCAN_CHUNK = 65536
 
-def save_state(st):
-    with open("state.json","w",encoding="utf-8") as f:
-        json.dump(st, f, ensure_ascii=False, indent=2)
+def parse_simple_selector(selector):
+    """'div#main .days' → [(tag, [(attr, waarde|None), ...]), ...] of None als het niet simpel is."""
+    parts = (selector or "").split()
+    if not parts or not all(_SIMPLE_SEL_RE.match(p) for p in parts):
+        return None
+    out = []
+    for p in parts:
+        tag = re.match(r"[\w-]+|\*", p)
+        conds = []
+        for m in _SEL_PART_RE.finditer(p):
+            if m.group(1) == "#": conds.append(("id", m.group(2)))
+            elif m.group(1) == ".": conds.append(("class~", m.group(2)))
+            else: conds.append((m.group(3).lower(), m.group(4)))
+        out.append(((tag.group(0).lower() if tag and tag.group(0) != "*" else None), conds))
+    return out
 
-# ====== main ======
-def main():
-    for req in ("LOGIN_URL","TARGET_URL","SITE_USERNAME","SITE_PASSWORD","TELEGRAM_BOT_TOKEN","TELEGRAM_CHAT_ID"):
-        if not os.getenv(req):
-            print(f"Missing env: {req}", file=sys.stderr); return 2
+def _compound_matches(compound, tag, attrs):
+    ctag, conds = compound
+    if ctag and ctag != tag: return False
+    for name, val in conds:
+        if name == "class~":
+            if val not in (attrs.get("class") or "").split(): return False
+        elif name not in attrs or (val is not None and attrs[name] != val):
+            return False
+    return True
 
-    if USE_PLAYWRIGHT:
-        html, final_url, selected_text, png_written = fetch_via_playwright()
+class PageScanner(HTMLParser):
+    """
+    Eén streaming pass over de HTML: verzamelt de tekst van de eerste match van de selector
+    (of van de hele pagina), en houdt bij of marker en CONFIRM_TEXT zijn gezien.
+    Binnen de regio is elke (buitenste) match van een slot-selector één slot (tekst per element).
+    Stopt (done) zodra de regio dicht is en CONFIRM_TEXT beslist is.
+    """
+    def __init__(self, selector_parts, marker, confirm, slot_parts=()):
+        super().__init__(convert_charrefs=True)
+        self.sel, self.marker, self.confirm = selector_parts, marker, confirm
+        self.slot_sels = slot_parts if selector_parts else ()
+        self.slot_depth = None     # stackdiepte van het open slot-element
+        self.slots, self._slot = [], []
+        self.stack = []            # [(tag, attrs)]
+        self.skip = 0              # diepte binnen <script>/<style>
+        self.region_depth = None   # stackdiepte van de regio-root
+        self.region_found = self.region_done = False
+        self.region, self.full = [], []
+        self.marker_seen = self.confirm_seen = False
+        self._mtail = self._ctail = ""   # genormaliseerde staart, voor matches over tekstnodes heen
+
+    def _match(self, parts=None):
+        # laatste compound moet op het huidige element matchen, de rest op voorouders (in volgorde)
+        *anc, last = parts or self.sel
+        tag, attrs = self.stack[-1]
+        if not _compound_matches(last, tag, attrs): return False
+        i = len(anc) - 1
+        for t, a in reversed(self.stack[:-1]):
+            if i < 0: break
+            if _compound_matches(anc[i], t, a): i -= 1
+        return i < 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script","style"):
+            self.skip += 1
+        if tag in VOID_TAGS: return
+        closes = IMPLIED_END.get(tag)
+        if closes:
+            # tot de buitenste match binnen de scope: <tr> sluit de vorige tr (met zijn td), niet
+            # alleen de td; anders nesten de rijen en wordt elke starttag duurder
+            hit = None
+            for i in range(len(self.stack) - 1, -1, -1):
+                if self.stack[i][0] in IMPLIED_SCOPE:
+                    break
+                if self.stack[i][0] in closes:
+                    hit = i
+            if hit is not None:
+                self._pop_to(hit)
+        self.stack.append((tag, {k: (v or "") for k, v in attrs}))
+        if self.sel and self.region_depth is None and not self.region_done and self._match():
+            self.region_depth, self.region_found = len(self.stack), True
+            self.full, self._mtail = [], ""   # regio gevonden: volledige tekst niet meer nodig
+        elif self.region_depth is not None and any(self._match(p) for p in self.slot_sels):
+            self.close_slot()   # nieuw slot binnen een open slot: het vorige slot is klaar
+            self.slot_depth = len(self.stack)
+
+    def close_slot(self):
+        if self._slot:
+            self.slots.append(" ".join(self._slot))
+        self.slot_depth, self._slot = None, []
+
+    def handle_endtag(self, tag):
+        if tag in ("script","style") and self.skip:
+            self.skip -= 1
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                self._pop_to(i); break
+
+    def _pop_to(self, i):
+        del self.stack[i:]
+        if self.slot_depth is not None and len(self.stack) < self.slot_depth:
+            self.close_slot()
+        if self.region_depth is not None and len(self.stack) < self.region_depth:
+            self.region_depth, self.region_done = None, True
+
+    def handle_data(self, data):
+        if self.skip: return
+        piece = data.strip()
+        if not piece: return
+        if self.region_depth is not None:
+            self.region.append(piece)
+            if self.slot_depth is not None:
+                self._slot.append(piece)
+        elif not self.region_done:
+            self.full.append(piece)
+        norm = normalize(piece)
+        if self.confirm and not self.confirm_seen:
+            self._ctail = (self._ctail + " " + norm)[-(len(self.confirm) + len(norm) + 1):]
+            self.confirm_seen = self.confirm in self._ctail
+        if self.marker and not self.marker_seen and (self.region_depth is not None or not self.sel):
+            self._mtail = (self._mtail + " " + norm)[-(len(self.marker) + len(norm) + 1):]
+            self.marker_seen = self.marker in self._mtail
+
+    @property
+    def done(self):
+        # zonder selector én zonder marker (regio kwam al van Playwright) valt er niets te beslissen
+        region_decided = self.region_done if self.sel else (self.marker_seen or not self.marker)
+        return region_decided and (not self.confirm or self.confirm_seen)
+
+def scan_html(html: str, t=None, need_region=True):
+    """Streaming extractie: {"relevant": str, "marker": bool, "confirmed": bool, "region": bool,
+    "slots": [str]}. region: de selector matchte en de regio heeft tekst; slots: tekst per
+    slot-element binnen de regio (leeg zonder regio of slot-selector)."""
+    t = t or env_target()
+    selector = t.get("css_selector") or ""
+    parts = parse_simple_selector(selector) if selector else None
+    slot_selector = t.get("slot_selector") or ""
+    slot_parts = [p for p in map(parse_simple_selector, slot_selector.split(",")) if p]
+    marker = normalize(t.get("text_to_find") or TEXT_TO_FIND)
+    confirm = normalize(t.get("confirm_text") or "")
+    sc = PageScanner(parts if need_region else None, marker if need_region else "", confirm, slot_parts)
+    html = html or ""
+    for i in range(0, len(html), SCAN_CHUNK):
+        sc.feed(html[i:i + SCAN_CHUNK])
+        if sc.done: break
+    sc.close_slot()   # regio niet netjes gesloten (afgekapte HTML)
+    slots, region = sc.slots, False
+    if parts and sc.region_found:
+        relevant, marker_seen = " ".join(sc.region), sc.marker_seen
+        region = bool(relevant)
+    elif need_region and selector and parts is None:
+        # complexe selector: terugvallen op BeautifulSoup voor de regio
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, "html.parser")
+        el = soup.select_one(selector)
+        relevant = el.get_text(separator=" ", strip=True) if el else extract_relevant_text(html)
+        marker_seen = marker in normalize(relevant)
+        region = bool(el and relevant)
+        if el and slot_selector:
+            try: slots = _soup_slots(el, slot_selector)
+            except Exception: slots = []
     else:
-        html, final_url = fetch_via_requests(); selected_text=""; png_written=False
+        # geen selector, of selector niet gevonden: hele pagina
+        relevant = " ".join(sc.full)
+        marker_seen = sc.marker_seen if not parts else marker in normalize(relevant)
+    return {"relevant": relevant, "marker": marker_seen, "confirmed": sc.confirm_seen,
+            "region": region, "slots": slots}
+
+def _soup_slots(el, slot_selector):
+    """Tekst per slot-match; tekst van een geneste match (html.parser nest <li>a<li>b) telt
+    alleen voor die binnenste match."""
+    matches = el.select(slot_selector)
+    ids = {id(m) for m in matches}
+    out = {id(m): [] for m in matches}
+    for node in el.find_all(string=True):
+        owner = next((p for p in node.parents if id(p) in ids), None)
+        if owner is not None and node.strip() and node.parent.name not in ("script", "style"):
+            out[id(owner)].append(node.strip())
+    return [" ".join(out[id(m)]) for m in matches if out[id(m)]]
+
+def slot_fingerprints(texts, marker=""):
+    """{fingerprint: label} per slot; dubbele en lege slots (en de marker zelf) vallen weg."""
+    out = {}
+    for text in texts:
+        norm = normalize(text)
+        if norm and not (marker and marker in norm):
+            out.setdefault(content_hash(norm)[:12], re.sub(r"\s+", " ", text).strip()[:120])
+    return out
+
+def evaluate(html: str, final_url: str, selected_text: str = "", t=None):
+    """
+    Verdict voor een opgehaalde pagina: {"verdict": "login"|"url_mismatch"|"unconfirmed"|"ok",
+    "available": bool|None, "relevant": str, "region": bool, "slots": {fingerprint: label}|None}.
+    region: CSS_SELECTOR gaf een niet-lege regio; slots is None als er geen slot-structuur te
+    herkennen was (dan telt alleen "available").
+    """
+    t = t or env_target()
+    out = {"verdict": "ok", "available": None, "relevant": "", "region": False, "slots": None}
+    if looks_like_login_page(html):
+        out["verdict"] = "login"; return out
+    if not url_checks(final_url, t):
+        out["verdict"] = "url_mismatch"; return out
+    have_region = bool(t.get("css_selector") and selected_text)
+    want_slots = bool(t.get("css_selector") and t.get("slot_selector"))
+    if have_region and not t.get("confirm_text") and not want_slots:
+        sc = None   # Playwright leverde de regio al; niets te parsen
+    else:
+        sc = scan_html(html, t, need_region=not have_region or want_slots)
+    if t.get("confirm_text") and not sc["confirmed"]:
+        out["verdict"] = "unconfirmed"; return out
+    marker = normalize(t.get("text_to_find") or TEXT_TO_FIND)
+    if have_region:
+        out["relevant"], out["region"] = selected_text, True
+        out["available"] = marker not in normalize(selected_text)
+    else:
+        out["relevant"], out["region"] = sc["relevant"], sc["region"]
+        out["available"] = not sc["marker"]
+    if want_slots:
+        slots = slot_fingerprints(sc["slots"], marker) if out["available"] else {}
+        out["slots"] = slots if slots or not out["available"] else None
+    return out
+
+_STORE = {"store": None}
 
-    save_snapshot_files(html, png_written)
-    full_text = unescape(html)
+def get_store():
+    if _STORE["store"] is None:
+        _STORE["store"] = state_store.open_store(default_name=TARGET_NAME)
+    return _STORE["store"]
+
+def load_all_state():
+    """{"targets": {naam: {"available": ...}}} uit de state-backend."""
+    return {"targets": get_store().all()}
+
+def load_state(name=None):
+    return get_store().get(name or TARGET_NAME) or {"available": None}
+
+def save_all_state(allst):
+    store = get_store()
+    for name, st in allst["targets"].items():
+        store.set(name, st)
+
+def save_state(st, name=None):
+    """Geeft True terug als "available" veranderde."""
+    return get_store().set(name or TARGET_NAME, st)
+
+def diff_slots(prev_st, slots):
+    """(nieuw, weg) als {fingerprint: label} t.o.v. de vorige state; None als er niets te
+    vergelijken valt (geen slot-structuur nu, of een oude state zonder "slots")."""
+    prev_slots = (prev_st or {}).get("slots")
+    if slots is None or prev_slots is None:
+        return None
+    return ({fp: label for fp, label in slots.items() if fp not in prev_slots},
+            {fp: label for fp, label in prev_slots.items() if fp not in slots})
+
+def slots_message(new, limit=10):
+    lines = [f"• {label}" for label in list(new.values())[:limit]]
+    if len(new) > limit:
+        lines.append(f"… en nog {len(new) - limit}")
+    return "🎉 Nieuwe dagen beschikbaar:\n" + "\n".join(lines) + "\nCheck de site nu."
+
+# ====== metrics ======
+def _ms_since(t0):
+    return round((time.perf_counter() - t0) * 1000, 1)
+
+def emit_metric(rec):
+    """Eén JSON-regel per check in METRICS_FILE (append-only)."""
+    if not METRICS_FILE: return
+    try:
+        with open(METRICS_FILE,"a",encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False, separators=(",",":")) + "\n")
+    except Exception as e:
+        print(f"Metrics write failed: {e}", file=sys.stderr)
+
+# ====== check ======
+def check_once():
+    """Eén check. Geeft dict terug: rc, changed, status ("BESCHIKBAAR"/"GEEN"/None), verdict."""
+    m = {"ts": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"), "target": TARGET_NAME,
+         "path": None, "ms": {}, "bytes": 0, "login": False, "verdict": "error",
+         "available": None, "changed": False}
+    trace_begin()
+    prof = None
+    if PROFILE_CHECK:
+        import cProfile
+        prof = cProfile.Profile(); prof.enable()
+    t0 = time.perf_counter()
+    try:
+        result = _check(m)
+        result["verdict"] = m["verdict"]
+        return result
+    finally:
+        release_page()
+        if prof is not None:
+            prof.disable(); write_profile(prof)
+        m["ms"] = trace_summary()
+        m["ms"]["total"] = _ms_since(t0)
+        print(trace_line(m["ms"]["total"]))
+        trace_export()
+        emit_metric(m)
+
+def _check(m):
+    result = {"rc": 0, "changed": False, "status": None}
+    prev_st = load_state()
+    prev = prev_st.get("available")
+    with phase("fetch"):
+        res = fetch_page()
+        if res.get("unchanged") and prev is None:
+            save_page_cache({})  # validators zonder state: opnieuw volledig ophalen
+            res = fetch_page()
+    m.update(path=res["path"], bytes=res.get("bytes", 0), login=bool(res.get("login")))
+    html, final_url, selected_text = res["html"], res["url"], res["selected_text"]
+
+    # Ongewijzigd t.o.v. vorige (beslissende) check? Dan niets parsen of matchen.
+    cache = load_page_cache() if prev is not None else {}
+    unchanged = res.get("unchanged")
+    if not unchanged and cache:
+        if html and cache.get("body_hash") == content_hash(html):
+            unchanged = "body hash match"
+        elif CSS_SELECTOR and selected_text and cache.get("region_hash") == content_hash(normalize(selected_text)):
+            unchanged = "region hash match"
+    if unchanged and prev is not None:
+        m.update(verdict="unchanged", available=prev)
+        result["status"] = "BESCHIKBAAR" if prev else "GEEN"
+        print(f"Unchanged ({unchanged}); skip parse.")
+        print(f"Status: {result['status']} (unchanged)")
+        print(f"Final URL: {final_url}")
+        return result
+
+    with phase("parse"): v = res.get("eval") or evaluate(html, final_url, selected_text)
+    m["verdict"] = v["verdict"]
+    if v["verdict"] != "ok":
+        take_snapshot(snapshots.reason_for(v["verdict"]), res, m)
 
     # Nog op login? (geen loop)
-    if looks_like_login_page(full_text):
+    if v["verdict"] == "login":
+        invalidate_session()
         print("Op loginpagina gebleven; login is niet gelukt (submit disabled of geweigerd).")
         print(f"Final URL: {final_url}")
-        return 0
+        return result
 
-    if not url_checks(final_url):
+    if v["verdict"] == "url_mismatch":
         print(f"Final URL (mismatch): {final_url}")
-        return 0
-    if CONFIRM_TEXT and normalize(CONFIRM_TEXT) not in normalize(full_text):
+        return result
+    if v["verdict"] == "unconfirmed":
         print(f"CONFIRM_TEXT '{CONFIRM_TEXT}' niet gevonden; geen alert.")
         print(f"Final URL: {final_url}")
-        return 0
+        return result
 
-    relevant = selected_text if (CSS_SELECTOR and selected_text) else extract_relevant_text(full_text)
-    available = normalize(TEXT_TO_FIND) not in normalize(relevant)
+    relevant, available = v["relevant"], v["available"]
+    save_page_cache({"etag": res.get("etag"), "last_modified": res.get("last_modified"),
+                     "body_hash": content_hash(html), "region_hash": content_hash(normalize(relevant))})
 
-    state = load_state()
-    prev = state.get("available")
-    if available and prev is not True:
-        send_telegram("🎉 Er lijken dagen beschikbaar! Check de site nu.")
+    m["available"] = available
+    slots, diff = v.get("slots"), diff_slots(prev_st, v.get("slots"))
+    if diff is not None:
+        new, gone = diff
+        print(f"Slots: {len(slots)} ({len(new)} nieuw, {len(gone)} weg)")
+        if available and new:
+            with phase("notify"): send_telegram(slots_message(new))
+            print("Notificatie verstuurd.")
+    elif available and prev is not True:
+        with phase("notify"):
+            send_telegram(slots_message(slots) if slots else "🎉 Er lijken dagen beschikbaar! Check de site nu.")
         print("Notificatie verstuurd.")
-    if (prev is None) or (available != prev):
-        save_state({"available": available})
+    if (prev is None) or (available != prev) or (diff is not None and any(diff)) or \
+            (slots is not None and "slots" not in prev_st):
+        st = {"available": available}
+        if slots is not None: st["slots"] = slots
+        with phase("state"): save_state(st)
         print("STATE_CHANGED=1")
+        result["changed"] = m["changed"] = True
+    take_snapshot(snapshots.reason_for("ok", result["changed"]), res, m)
 
-    print(f"Status: {'BESCHIKBAAR' if available else 'GEEN'}")
+    result["status"] = "BESCHIKBAAR" if available else "GEEN"
+    print(f"Status: {result['status']}")
     print(f"Final URL: {final_url}")
     print("Relevant snippet (first 300 chars):", (relevant or "")[:300].replace("\n"," "))
-    if DEBUG_SNAPSHOT: print("SNAPSHOT_DEBUG=on")
+    return result
+
+def missing_env():
+    return [k for k in REQUIRED_ENV if not os.getenv(k)]
+
+# ====== main ======
+def main():
+    for req in missing_env():
+        print(f"Missing env: {req}", file=sys.stderr); return 2
+    return check_once()["rc"]
+
+# ====== daemon ======
+def _hm(s: str) -> int:
+    h, m = s.split(":", 1)
+    return int(h) * 60 + int(m)
+
+def in_quiet(now=None) -> bool:
+    if not (QUIET_START and QUIET_END): return False
+    now = now or dt.datetime.now(ZoneInfo(QUIET_TZ))
+    cur, start, end = now.hour * 60 + now.minute, _hm(QUIET_START), _hm(QUIET_END)
+    if start <= end:
+        return start <= cur < end
+    return cur >= start or cur < end
+
+def seconds_until_quiet_end(now=None) -> float:
+    now = now or dt.datetime.now(ZoneInfo(QUIET_TZ))
+    end_min = _hm(QUIET_END)
+    end = now.replace(hour=end_min // 60, minute=end_min % 60, second=0, microsecond=0)
+    if end <= now:
+        end += dt.timedelta(days=1)
+    return (end - now).total_seconds()
+
+def make_scheduler(end_ts):
+    tz = ZoneInfo(QUIET_TZ)
+    try:
+        history = get_store().transitions(TARGET_NAME)
+    except Exception as e:
+        print(f"Warn: transitions not readable ({e})", file=sys.stderr); history = []
+    sched = scheduler.PollScheduler(dt.datetime.fromtimestamp(end_ts, tz), tz, MIN_SLEEP_SEC, MAX_SLEEP_SEC,
+                                    is_quiet=in_quiet, transitions=history,
+                                    budget=scheduler.DAEMON_CHECK_BUDGET or DAEMON_MAX_CHECKS)
+    print(f"Scheduler: budget={sched.budget} checks, {len(sched.hot_minutes)} eerdere overgang(en).")
+    return sched
+
+def _git(*args):
+    """(returncode, output) van één git-commando; nooit een exception."""
+    try:
+        r = subprocess.run(["git", *args], capture_output=True, text=True, timeout=120)
+        return r.returncode, (r.stdout + r.stderr).strip()
+    except Exception as e:
+        return -1, str(e)
+
+def _rebase_in_progress():
+    for d in ("rebase-merge", "rebase-apply"):
+        rc, out = _git("rev-parse", "--git-path", d)
+        if rc == 0 and os.path.isdir(out):
+            return True
+    return False
+
+def git_commit_state():
+    """State committen en pushen. Geeft False als dat niet lukte (de volgende sync probeert opnieuw)."""
+    path = state_store.STATE_FILE
+    try:
+        get_store().export(path)
+    except Exception as e:
+        print(f"State export failed: {e}", file=sys.stderr); return False
+    if _rebase_in_progress():
+        # overblijfsel van een eerdere (afgebroken) sync: anders faalt elke volgende sync
+        print("Git sync: rebase in progress → aborting it first.", file=sys.stderr)
+        _git("rebase", "--abort")
+    rc, out = _git("add", path)
+    if rc != 0:
+        print(f"git add failed ({rc}): {out}", file=sys.stderr); return False
+    rc, out = _git("commit", "-m", "Update state [skip ci]")
+    if rc != 0 and "nothing to commit" not in out and "nothing added" not in out:
+        print(f"git commit failed ({rc}): {out}", file=sys.stderr); return False
+    # check.yml commit state.json ook; bij een conflict wint onze (nieuwere) versie (-X theirs = de
+    # commits die gerebased worden)
+    rc, out = _git("pull", "--rebase", "-X", "theirs")
+    if rc != 0:
+        print(f"git pull --rebase failed ({rc}): {out}", file=sys.stderr)
+        if _rebase_in_progress():
+            arc, aout = _git("rebase", "--abort")
+            print("Git sync: rebase aborted." if arc == 0 else f"git rebase --abort failed ({arc}): {aout}",
+                  file=sys.stderr)
+        return False
+    rc, out = _git("push")
+    if rc != 0:
+        print(f"git push failed ({rc}): {out}", file=sys.stderr); return False
+    return True
+
+class GitSync:
+    """State naar git in de achtergrond: hoogstens eens per `interval` s, en bij close()."""
+    def __init__(self, interval):
+        self.interval = interval
+        self._dirty, self._stop = threading.Event(), threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        if interval > 0:
+            self._thread = threading.Thread(target=self._run, name="git-sync", daemon=True)
+            self._thread.start()
+
+    def mark_dirty(self):
+        self._dirty.set()
+        if self.interval <= 0:
+            self._sync()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self._dirty.is_set():
+                self._sync()
+
+    def _sync(self):
+        with self._lock:
+            self._dirty.clear()
+            print("Git sync: pushing state …", flush=True)
+            if not git_commit_state():
+                self._dirty.set()   # volgende interval opnieuw
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        if self._dirty.is_set():
+            self._sync()
+
+def run_daemon():
+    for req in missing_env():
+        print(f"Missing env: {req}", file=sys.stderr); return 2
+    print(f"Daemon start: duration={DAEMON_DURATION_SEC}s max_checks={DAEMON_MAX_CHECKS or '-'} "
+          f"recycle={BROWSER_RECYCLE_CHECKS} test_mode={TEST_MODE}")
+    end = time.time() + DAEMON_DURATION_SEC
+    n = 0
+    sync = GitSync(GIT_SYNC_INTERVAL_SEC) if DAEMON_GIT_COMMIT else None
+    sched = make_scheduler(end)
+    try:
+        while time.time() < end and not (DAEMON_MAX_CHECKS and n >= DAEMON_MAX_CHECKS):
+            if in_quiet():
+                wait = min(seconds_until_quiet_end(), max(end - time.time(), 0))
+                print(f"Quiet hours: sleeping {int(wait)} s until {QUIET_END} {QUIET_TZ} ...")
+                time.sleep(wait)
+                continue
+
+            n += 1
+            print(f"::group::check @ {dt.datetime.now(dt.timezone.utc).strftime('%F %T')} UTC", flush=True)
+            started, throttled, retry_after = time.monotonic(), False, None
+            try:
+                result = check_once()
+            except Exception as e:
+                throttled, retry_after = scheduler.throttle_info(e)
+                if throttled:
+                    print(f"Throttled by site: {e}", file=sys.stderr)
+                else:
+                    print("UNCAUGHT EXCEPTION:", file=sys.stderr)
+                    traceback.print_exc()
+                    close_browser()  # crash → schone browser voor de volgende check
+                result = {"rc": 1, "changed": False, "status": None, "verdict": "error"}
+            print("::endgroup::", flush=True)
+            sched.observe(result["verdict"] in ("ok", "unchanged"), time.monotonic() - started,
+                          throttled, retry_after)
+
+            if result["changed"] and sync is not None:
+                sync.mark_dirty()
+            if TEST_MODE and not result["changed"]:
+                stamp = dt.datetime.now(dt.timezone.utc).strftime("%F %T")
+                send_telegram(f"[TEST] Geen verandering ({result['status'] or 'onbekend'}) @ {stamp} UTC")
+            if BROWSER_RECYCLE_CHECKS and _PW["checks"] >= BROWSER_RECYCLE_CHECKS:
+                print(f"Recycling browser after {_PW['checks']} checks.")
+                close_browser()
+
+            if time.time() >= end or (DAEMON_MAX_CHECKS and n >= DAEMON_MAX_CHECKS):
+                break
+            dur, why = sched.next_delay()
+            dur = min(dur, max(int(end - time.time()), 0))
+            print(f"Sleeping {dur}s before next check ({why})...", flush=True)
+            time.sleep(dur)
+    finally:
+        close_browser(stop=True)
+        notifier.close_all()
+        if sync is not None:
+            sync.close()
+    print(f"Daemon done: {n} checks.")
+    return 0
+
+# ====== pre-warmed worker ======
+WORKER_RC = "\0RC="   # laatste regel van een worker-antwoord
+
+def _serve_one(req, out):
+    """Eén check met de env/cwd van de client; output gaat terug over de socket."""
+    os.environ.clear(); os.environ.update(req.get("env") or {})
+    os.chdir(req.get("cwd") or os.getcwd())
+    load_config()
+    _STORE["store"] = None
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+        try:
+            rc = main()
+        except Exception:
+            print("UNCAUGHT EXCEPTION:", file=sys.stderr)
+            traceback.print_exc()
+            rc = 1
+            close_browser()
+        notifier.flush_all()   # zoals bij een one-shot: alerts zijn weg voor de client klaar is
+        snapshots.flush()
+    return rc
+
+def serve_worker():
+    """Unix-socket server: per verbinding één check, tot WORKER_IDLE_SEC zonder verzoek."""
+    import socket
+    path = WORKER_SOCKET
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+    srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    srv.bind(path)
+    os.chmod(path, 0o600)   # verzoeken bevatten de env (secrets)
+    srv.listen(4)
+    srv.settimeout(WORKER_IDLE_SEC or None)
+    print(f"Worker listening on {path} (idle timeout {WORKER_IDLE_SEC or '-'}s).", flush=True)
+    n = 0
+    try:
+        while True:
+            try:
+                conn, _ = srv.accept()
+            except socket.timeout:
+                print("Worker idle → exit.")
+                break
+            conn.settimeout(None)
+            try:
+                with conn, conn.makefile("rw", encoding="utf-8", newline="\n") as f:
+                    req = json.loads(f.readline() or "{}")
+                    rc = _serve_one(req, f)
+                    f.write(f"{WORKER_RC}{rc}\n"); f.flush()
+            except (OSError, ValueError) as e:
+                print(f"Worker: request failed ({e}).", file=sys.stderr, flush=True)
+                continue
+            n += 1
+            print(f"Worker: check {n} done (rc={rc}).", flush=True)
+            if BROWSER_RECYCLE_CHECKS and _PW["checks"] >= BROWSER_RECYCLE_CHECKS:
+                close_browser()
+    finally:
+        srv.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
     return 0
 
+def run_via_worker():
+    """Check via een draaiende worker; is er geen, dan gewoon lokaal."""
+    import socket
+    try:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.connect(WORKER_SOCKET)
+    except OSError:
+        print(f"No worker on {WORKER_SOCKET}; running locally.", file=sys.stderr)
+        return main()
+    rc = 1
+    with s, s.makefile("rw", encoding="utf-8", newline="\n") as f:
+        f.write(json.dumps({"env": dict(os.environ), "cwd": os.getcwd()}) + "\n"); f.flush()
+        for line in f:
+            text, sep, tail = line.partition(WORKER_RC)
+            sys.stdout.write(text)
+            if sep:
+                rc = int(tail); break
+    return rc
+
 if __name__ == "__main__":
+    args = sys.argv[1:]
     try:
-        sys.exit(main())
+        sys.exit(run_daemon() if "--daemon" in args else serve_worker() if "--serve" in args
+                 else run_via_worker() if "--via" in args else main())
     except Exception:
         print("UNCAUGHT EXCEPTION:", file=sys.stderr)
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        close_browser(stop=True)
+        notifier.close_all()
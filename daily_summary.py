@@ -1,5 +1,7 @@
-import os, sys, io, re, zipfile, requests
+import os, sys, re, json, math, zipfile, tempfile, requests
+import notifier
 import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
 from zoneinfo import ZoneInfo
 
 # ===== env =====
@@ -17,42 +19,127 @@ LOCAL_HOUR    = int(os.getenv("LOCAL_HOUR", "18"))            # 18:00 lokale tij
 # Marker waarmee we checks herkennen in de daemon-logs:
 CHECK_REGEX   = os.getenv("CHECK_REGEX", r"^::group::check ").encode()
 
+# Parallel logs lezen + cache van check-aantallen per afgeronde run
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "4"))
+RUN_CACHE_FILE  = os.getenv("RUN_CACHE_FILE", "summary_cache.json")
+# Incrementeel runs ophalen: per workflow high-water mark + ETags + bekende runs
+RUN_LIST_FILE   = os.getenv("RUN_LIST_FILE", "runs_cache.json")
+
+# Gestructureerde metrics van checker.py (één JSON-record per check)
+METRICS_ARTIFACT = os.getenv("METRICS_ARTIFACT", "metrics")   # artifact-naam in de daemon-runs
+METRICS_FILE     = os.getenv("METRICS_FILE", "")              # optioneel lokaal metrics.jsonl
+
 HDRS = {
     "Authorization": f"Bearer {TOKEN}",
     "Accept": "application/vnd.github+json",
     "X-GitHub-Api-Version": "2022-11-28",
 }
 
+# Eén gedeelde keep-alive sessie voor alle GitHub-calls (ook vanuit de thread pool)
+SESSION = requests.Session()
+SESSION.headers.update(HDRS)
+_adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max(SUMMARY_WORKERS, 4))
+SESSION.mount("https://", _adapter)
+
 def telegram(msg: str):
-    url = f"https://api.telegram.org/bot{TG_TOKEN}/sendMessage"
-    r = requests.post(url, data={"chat_id": TG_CHAT, "text": msg}, timeout=30)
-    r.raise_for_status()
+    n = notifier.get_notifier(TG_TOKEN)
+    n.send(TG_CHAT, msg)
+    if n.flush():
+        raise RuntimeError("Telegram: bericht niet verstuurd (zie log).")
+
+def load_run_cache():
+    try:
+        with open(RUN_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
 
-def list_runs_since(owner, repo, workflow_file, since_utc):
-    runs = []
-    page = 1
-    while True:
-        url = f"https://api.github.com/repos/{owner}/{repo}/actions/workflows/{workflow_file}/runs"
-        r = requests.get(url, headers=HDRS, params={"per_page": 100, "page": page}, timeout=30)
+def save_run_cache(cache):
+    try:
+        with open(RUN_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+    except Exception as e:
+        print(f"Warn: run cache write failed ({e})", file=sys.stderr)
+
+def load_json_file(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _iso(ts):
+    return dt.datetime.fromisoformat(ts.replace("Z", "+00:00"))
+
+def _gh_ts(t):
+    return t.astimezone(dt.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def get_runs(url, params, etag=None):
+    """
+    Alle pagina's van een runs-listing: (runs, ETag van pagina 1). Pagina 1 conditioneel
+    (If-None-Match): bij 304 telt de call niet mee voor de rate limit en is runs None (= niets nieuws).
+    De ETag hoort bij de inhoud, niet bij de query: 304 betekent dat het antwoord gelijk is aan
+    het vorige, dus dezelfde runs die we al verwerkt hebben.
+    """
+    hdrs = {"If-None-Match": etag} if etag else {}
+    items, page, new_etag = [], 1, None
+    while page <= 10:
+        r = SESSION.get(url, params=dict(params, per_page=100, page=page), headers=hdrs, timeout=30)
+        if r.status_code == 304:
+            return None, etag
         r.raise_for_status()
-        data = r.json()
-        items = data.get("workflow_runs", [])
-        if not items:
-            break
-        # voeg alle runs toe die binnen het venster vallen
-        stop = False
-        for it in items:
-            created = dt.datetime.fromisoformat(it["created_at"].replace("Z", "+00:00"))
-            if created >= since_utc:
-                runs.append(it)
-            else:
-                stop = True
-        if stop:
+        if page == 1:
+            new_etag = r.headers.get("ETag")
+        batch = r.json().get("workflow_runs", [])
+        items += batch
+        if len(batch) < 100:
             break
-        page += 1
-        if page > 10:
-            break
-    return runs
+        page, hdrs = page + 1, {}
+    return items, new_etag
+
+def list_runs_since(owner, repo, workflow_file, since_utc, state):
+    """
+    Runs van één workflow sinds since_utc. `state` (per workflow, blijft bewaard in RUN_LIST_FILE):
+    {"runs": {id: {id, status, created_at}}, "hwm": created_at van de nieuwste afgeronde run,
+     "etag": ...}. Alleen runs vanaf de high-water mark worden opgevraagd (server-side
+    `created`-filter), zonder `status`-filter: alles wat niet "completed" is (queued, waiting,
+    requested, pending, in_progress) blijft als lopend bewaard en houdt de mark tegen tot het klaar is.
+    """
+    url = f"https://api.github.com/repos/{owner}/{repo}/actions/workflows/{workflow_file}/runs"
+    known = {k: v for k, v in (state.get("runs") or {}).items() if _iso(v["created_at"]) >= since_utc}
+    # lopende runs van de vorige keer moeten nog als "completed" terugkomen → mark niet voorbij hen
+    start = max(since_utc, _iso(state["hwm"])) if state.get("hwm") else since_utc
+    pending = [_iso(v["created_at"]) for v in known.values() if v["status"] != "completed"]
+    start = min([start] + pending)
+
+    for old in ("etag_completed", "etag_running"):   # formaat van vóór de ETag per workflow
+        state.pop(old, None)
+    items, state["etag"] = get_runs(url, {"created": ">=" + _gh_ts(start)}, state.get("etag"))
+    for it in items or []:   # None = 304: niets veranderd
+        if _iso(it["created_at"]) >= since_utc:
+            known[str(it["id"])] = {"id": it["id"], "status": it["status"], "created_at": it["created_at"]}
+
+    done = [v["created_at"] for v in known.values() if v["status"] == "completed"]
+    if done:
+        state["hwm"] = max(done, key=_iso)
+    state["runs"] = known
+    return sorted(known.values(), key=lambda v: _iso(v["created_at"]), reverse=True)
+
+def list_all_runs(owner, repo, workflow_files, since_utc):
+    """{workflow: [runs]} voor alle workflows tegelijk; bewaart de listing-state in RUN_LIST_FILE."""
+    state = load_json_file(RUN_LIST_FILE)
+    for wf in workflow_files:
+        state.setdefault(wf, {})
+    def one(wf):
+        return wf, list_runs_since(owner, repo, wf, since_utc, state[wf])
+    with ThreadPoolExecutor(max_workers=max(1, min(SUMMARY_WORKERS, len(workflow_files)))) as pool:
+        out = dict(pool.map(one, workflow_files))
+    try:
+        with open(RUN_LIST_FILE, "w", encoding="utf-8") as f:
+            json.dump({wf: state[wf] for wf in workflow_files}, f)
+    except Exception as e:
+        print(f"Warn: run list cache write failed ({e})", file=sys.stderr)
+    return out
 
 def count_checks_in_run(owner, repo, run_id, regex_bytes):
     """
@@ -60,23 +147,134 @@ def count_checks_in_run(owner, repo, run_id, regex_bytes):
     (we loggen elke iteratie met ::group::check ... in de daemon).
     """
     url = f"https://api.github.com/repos/{owner}/{repo}/actions/runs/{run_id}/logs"
-    r = requests.get(url, headers=HDRS, timeout=60)
-    r.raise_for_status()
-    z = zipfile.ZipFile(io.BytesIO(r.content))
-    total = 0
-    for name in z.namelist():
-        with z.open(name) as f:
-            # lees als bytes en tel regex hits lijn-gebaseerd voor performance
-            try:
-                for line in f:
-                    if line.startswith(regex_bytes):
-                        total += 1
-            except Exception:
-                # fallback: hele file als tekst
-                data = z.read(name)
-                total += len(re.findall(regex_bytes, data))
+    # zip streamen naar een tempfile i.p.v. volledig in RAM
+    with tempfile.TemporaryFile() as tmp:
+        with SESSION.get(url, timeout=60, stream=True) as r:
+            r.raise_for_status()
+            for chunk in r.iter_content(chunk_size=1 << 20):
+                tmp.write(chunk)
+        tmp.seek(0)
+        z = zipfile.ZipFile(tmp)
+        total = 0
+        for name in z.namelist():
+            with z.open(name) as f:
+                # lees als bytes en tel regex hits lijn-gebaseerd voor performance
+                try:
+                    for line in f:
+                        if line.startswith(regex_bytes):
+                            total += 1
+                except Exception:
+                    # fallback: hele file als tekst
+                    data = z.read(name)
+                    total += len(re.findall(regex_bytes, data))
     return total
 
+def parse_metrics(lines):
+    out = []
+    for line in lines:
+        line = line.strip()
+        if not line: continue
+        try:
+            out.append(json.loads(line))
+        except ValueError:
+            pass
+    return out
+
+def fetch_run_metrics(owner, repo, run_id):
+    """Metrics-records uit het METRICS_ARTIFACT van een run, of None als die er niet is."""
+    url = f"https://api.github.com/repos/{owner}/{repo}/actions/runs/{run_id}/artifacts"
+    r = SESSION.get(url, params={"name": METRICS_ARTIFACT, "per_page": 10}, timeout=30)
+    r.raise_for_status()
+    arts = [a for a in r.json().get("artifacts", []) if a["name"] == METRICS_ARTIFACT and not a.get("expired")]
+    if not arts:
+        return None
+    records = []
+    with tempfile.TemporaryFile() as tmp:
+        with SESSION.get(arts[0]["archive_download_url"], timeout=60, stream=True) as r:
+            r.raise_for_status()
+            for chunk in r.iter_content(chunk_size=1 << 20):
+                tmp.write(chunk)
+        tmp.seek(0)
+        z = zipfile.ZipFile(tmp)
+        for name in z.namelist():
+            if name.endswith(".jsonl"):
+                with z.open(name) as f:
+                    records += parse_metrics(l.decode("utf-8", "replace") for l in f)
+    return records
+
+def checks_for_runs(owner, repo, runs, regex_bytes, cache):
+    """
+    Per run: metrics-records (uit het artifact) of anders het aantal checks uit de logs.
+    Parallel (SUMMARY_WORKERS); afgeronde runs komen uit/naar `cache`
+    ({run_id: {"checks": n, "records": [...]|None}}), zodat ze nooit twee keer worden gedownload.
+    """
+    def one(run):
+        key = str(run["id"])
+        if key in cache:
+            entry = cache[key]
+            return run["id"], entry if isinstance(entry, dict) else {"checks": entry, "records": None}
+        entry = {"checks": 0, "records": None}
+        try:
+            entry["records"] = fetch_run_metrics(owner, repo, run["id"])
+            if entry["records"] is not None:
+                entry["checks"] = len(entry["records"])
+            else:
+                entry["checks"] = count_checks_in_run(owner, repo, run["id"], regex_bytes)
+        except requests.HTTPError as e:
+            print(f"Warn: failed to read logs/metrics for run {run['id']} ({e})", file=sys.stderr)
+            return run["id"], entry
+        if run.get("status") == "completed":
+            cache[key] = entry
+        return run["id"], entry
+
+    with ThreadPoolExecutor(max_workers=max(1, SUMMARY_WORKERS)) as pool:
+        return dict(pool.map(one, runs))
+
+def percentile(sorted_vals, pct):
+    if not sorted_vals: return None
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(pct / 100 * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+def aggregate_metrics(records):
+    totals = sorted(r["ms"]["total"] for r in records if (r.get("ms") or {}).get("total") is not None)
+    paths = {}
+    for r in records:
+        paths[r.get("path") or "-"] = paths.get(r.get("path") or "-", 0) + 1
+    n = len(records)
+    return {
+        "checks": n,
+        "p50": percentile(totals, 50), "p95": percentile(totals, 95),
+        "logins": sum(1 for r in records if r.get("login")),
+        "changes": sum(1 for r in records if r.get("changed")),
+        "errors": sum(1 for r in records if r.get("verdict") == "error"),
+        "unchanged": sum(1 for r in records if r.get("verdict") == "unchanged"),
+        "kb": sum(r.get("bytes") or 0 for r in records) / 1024,
+        "paths": paths,
+    }
+
+def metrics_lines(records):
+    a = aggregate_metrics(records)
+    if not a["checks"]:
+        return []
+    n = a["checks"]
+    return [
+        f"Latency p50/p95: {a['p50']:.0f} / {a['p95']:.0f} ms",
+        f"Logins: {a['logins']} ({a['logins'] / n:.0%}), statuswijzigingen: {a['changes']}, "
+        f"fouten: {a['errors']}, ongewijzigd: {a['unchanged']}",
+        "Fetch-paden: " + ", ".join(f"{k} {v}" for k, v in sorted(a["paths"].items())),
+        f"Data: {a['kb'] / 1024:.1f} MB ({a['kb'] / n:.0f} KB/check)",
+    ]
+
+def in_window(records, since_utc):
+    out = []
+    for r in records:
+        try:
+            if dt.datetime.fromisoformat(r["ts"]) >= since_utc:
+                out.append(r)
+        except (KeyError, ValueError):
+            pass
+    return out
+
 def main():
     # Guards
     if not (TOKEN and REPO and TG_TOKEN and TG_CHAT):
@@ -92,31 +290,53 @@ def main():
     owner, repo = REPO.split("/", 1)
     now_utc = dt.datetime.now(dt.timezone.utc)
     since_utc = now_utc - dt.timedelta(days=1)
+    window = f"{since_utc.isoformat(timespec='seconds')} → {now_utc.isoformat(timespec='seconds')} (UTC)"
+
+    # Lokaal metrics-bestand? Dan is dat de bron; geen API-calls nodig.
+    if METRICS_FILE and os.path.exists(METRICS_FILE):
+        with open(METRICS_FILE, "r", encoding="utf-8") as f:
+            records = in_window(parse_metrics(f), since_utc)
+        lines = ["📊 Dagelijkse statusupdate", f"Periode: {window}",
+                 f"Totale checks: {len(records)}"] + metrics_lines(records)
+        telegram("\n".join(lines))
+        print("Summary sent.")
+        return 0
+
+    # Verzamel runs + tel checks uit logs (parallel, afgeronde runs uit cache)
+    runs_by_wf = list_all_runs(owner, repo, WORKFLOW_FILES, since_utc)
+    all_runs = [r for runs in runs_by_wf.values() for r in runs]
+    cache = load_run_cache()
+    entries = checks_for_runs(owner, repo, all_runs, CHECK_REGEX, cache)
+    # alleen runs binnen het venster bewaren; oudere komen nooit meer terug
+    save_run_cache({str(r["id"]): cache[str(r["id"])] for r in all_runs if str(r["id"]) in cache})
 
-    # Verzamel runs + tel checks uit logs
     grand_total_checks = 0
+    from_logs = 0
+    records = []
     wf_summaries = []
-    for wf in WORKFLOW_FILES:
-        runs = list_runs_since(owner, repo, wf, since_utc)
-        run_ids = [r["id"] for r in runs]
+    for wf, runs in runs_by_wf.items():
         checks = 0
-        for rid in run_ids:
-            try:
-                checks += count_checks_in_run(owner, repo, rid, CHECK_REGEX)
-            except requests.HTTPError as e:
-                print(f"Warn: failed to read logs for run {rid} ({e})", file=sys.stderr)
+        for r in runs:
+            e = entries.get(r["id"]) or {"checks": 0, "records": None}
+            if e["records"] is not None:
+                recs = in_window(e["records"], since_utc)
+                records += recs
+                checks += len(recs)
+            else:
+                checks += e["checks"]
+                from_logs += e["checks"]
         grand_total_checks += checks
-        wf_summaries.append((wf, len(run_ids), checks))
+        wf_summaries.append((wf, len(runs), checks))
 
     # Bericht opbouwen
-    window = f"{since_utc.isoformat(timespec='seconds')} → {now_utc.isoformat(timespec='seconds')} (UTC)"
     lines = [
         "📊 Dagelijkse statusupdate",
         f"Periode: {window}",
-        f"Totale checks (uit logs): {grand_total_checks}"
+        f"Totale checks: {grand_total_checks} (metrics: {len(records)}, uit logs: {from_logs})"
     ]
     for (wf, runs_count, checks) in wf_summaries:
         lines.append(f"• {wf}: {runs_count} runs, {checks} checks")
+    lines += metrics_lines(records)
     msg = "\n".join(lines)
 
     telegram(msg)
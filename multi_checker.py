@@ -0,0 +1,274 @@
+# multi_checker.py
+# Checkt meerdere meeting-pagina's tegelijk in één browser (playwright.async_api).
+# Vereist env/secrets:
+# - TARGETS_FILE (JSON- of YAML-lijst, default "targets.json")
+# - TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
+# Per target (ontbrekende velden vallen terug op de env van checker.py):
+# - name, target_url, login_url, text_to_find, css_selector, slot_selector, confirm_text,
+#   expected_host, expected_path, username_env, password_env (namen van env vars)
+# Optioneel:
+# - MAX_PAGES (default 4), PER_HOST_CONCURRENCY (default 2), HOST_MIN_INTERVAL_SEC (default 2)
+# - BLOCK_RESOURCES / BLOCK_RESOURCE_TYPES / BLOCK_URL_PATTERNS / ALLOW_URL_PATTERNS /
+#   READY_TIMEOUT_MS, LOGIN_HINTS_FILE, STATE_BACKEND / STATE_FILE / STATE_DB: zelfde betekenis als in checker.py
+#
+# Voorbeeld targets.json:
+# [{"name": "team-a", "target_url": "https://portal.example/meetings/a",
+#   "login_url": "https://portal.example/login", "css_selector": "#days"}]
+
+import os, sys, json, time, asyncio, contextlib, traceback
+from urllib.parse import urlparse
+import checker, state_store
+
+TARGETS_FILE          = os.getenv("TARGETS_FILE", "targets.json")
+MAX_PAGES             = int(os.getenv("MAX_PAGES", "4"))
+PER_HOST_CONCURRENCY  = int(os.getenv("PER_HOST_CONCURRENCY", "2"))
+HOST_MIN_INTERVAL_SEC = float(os.getenv("HOST_MIN_INTERVAL_SEC", "2"))
+
+# korte/env-achtige namen die in targets-files ook mogen
+KEY_ALIASES = {"target": "target_url", "login": "login_url", "selector": "css_selector"}
+
+def load_targets(path):
+    with open(path, "r", encoding="utf-8") as f:
+        raw = f.read()
+    if path.endswith((".yml", ".yaml")):
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError("PyYAML is nodig voor een YAML targets-file (pip install pyyaml).")
+        items = yaml.safe_load(raw)
+    else:
+        items = json.loads(raw)
+
+    targets, seen = [], set()
+    for i, it in enumerate(items or []):
+        it = {KEY_ALIASES.get(k.lower(), k.lower()): v for k, v in (it or {}).items()}
+        t = checker.env_target()
+        t["name"] = f"target{i + 1}"
+        t.update({k: (v.strip() if isinstance(v, str) else v) for k, v in it.items() if v is not None})
+        t["username"] = os.getenv(it.get("username_env") or "SITE_USERNAME")
+        t["password"] = os.getenv(it.get("password_env") or "SITE_PASSWORD")
+        if not t.get("target_url"):
+            raise ValueError(f"Target {t['name']}: target_url ontbreekt.")
+        if t["name"] in seen:
+            raise ValueError(f"Dubbele target-naam: {t['name']}")
+        seen.add(t["name"])
+        targets.append(t)
+    return targets
+
+class HostGate:
+    """Per host maximaal `limit` gelijktijdige checks en minimaal `min_interval` s tussen starts."""
+    def __init__(self, limit, min_interval):
+        self.limit, self.min_interval = max(1, limit), min_interval
+        self._sems, self._locks, self._last = {}, {}, {}
+
+    @contextlib.asynccontextmanager
+    async def slot(self, host):
+        sem = self._sems.setdefault(host, asyncio.Semaphore(self.limit))
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with sem:
+            async with lock:
+                wait = self._last.get(host, 0) + self.min_interval - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._last[host] = time.monotonic()
+            yield
+
+# ====== login (async variant van checker.fetch_via_playwright) ======
+async def first_visible(page, selector):
+    loc = page.locator(selector)
+    try: n = await loc.count()
+    except Exception: return None
+    for i in range(n):
+        el = loc.nth(i)
+        try:
+            if await el.is_visible(): return el
+        except Exception:
+            pass
+    return None
+
+async def fill_visible(page, selectors, value, label, name):
+    for sel in selectors:
+        el = await first_visible(page, sel)
+        if el:
+            try: await el.fill(value, timeout=4000)
+            except Exception: await el.type(value, delay=10, timeout=4000)
+            print(f"[{name}] Filled {label}: {sel}")
+            return el, sel
+    return None, None
+
+async def needs_login(page):
+    return "login" in page.url.lower() or await page.locator('input[type="password"]').count() > 0
+
+async def left_login_page(page, start, timeout):
+    """Andere URL dan vóór de submit, of geen wachtwoordveld meer (zie checker.LOGIN_LEFT_JS)."""
+    try:
+        await page.wait_for_function(checker.LOGIN_LEFT_JS, arg=start, timeout=timeout)
+        return True
+    except Exception:
+        return False
+
+async def submit(page, strategy=None):
+    """Submit met de geleerde strategie, of click → Enter → requestSubmit(). Geeft de gebruikte terug."""
+    btn = page.locator('button[type="submit"], input[type="submit"]').first
+    try:
+        if strategy == "click" or (strategy is None and await btn.is_visible() and await btn.is_enabled()):
+            await btn.click(timeout=3000); return "click"
+        if strategy in (None, "enter"):
+            await page.keyboard.press("Enter"); return "enter"
+    except Exception:
+        pass
+    await page.evaluate(checker.SUBMIT_JS)
+    return "requestSubmit"
+
+async def login(page, t):
+    name, login_url = t["name"], t["login_url"]
+    print(f"[{name}] Login required → opening login_url …")
+    await page.goto(login_url, wait_until="domcontentloaded", timeout=60000)
+    hint = checker.load_login_hint(login_url)
+    user_cands, pass_cands, _ = checker.login_candidates()
+    uel, usel = await fill_visible(page, checker.prefer(user_cands, hint.get("user")),
+                                   t["username"] or "", "email/username", name)
+    pel, psel = (await fill_visible(page, checker.prefer(pass_cands, hint.get("pass")),
+                                    t["password"] or "", "password", name)) if uel else (None, None)
+    if not uel or not pel:
+        raise RuntimeError(f"[{name}] Kon zichtbare velden niet vinden.")
+
+    start_url = page.url
+    strategy = await submit(page, hint.get("submit"))
+    if hint.get("submit") and not await left_login_page(page, start_url, checker.LEARNED_SUBMIT_WAIT_MS):
+        print(f"[{name}] Learned submit ({hint['submit']}) did not leave the login page → full probe.")
+        strategy = await submit(page)
+    if not await left_login_page(page, start_url, 15000):
+        print(f"[{name}] Login page not left within 15s.")
+    await page.goto(t["target_url"], wait_until="domcontentloaded", timeout=30000)
+    if not await needs_login(page):
+        checker.save_login_hint(login_url, usel, psel, strategy)
+    elif hint:
+        checker.forget_login_hint(login_url)
+
+# ====== engine ======
+async def route_handler(route):
+    req = route.request
+    try:
+        if checker.should_block(req.resource_type, req.url): await route.abort()
+        else: await route.continue_()
+    except Exception:
+        pass  # pagina al weg
+
+async def check_target(context, t, pages, gate, login_locks):
+    name = t["name"]
+    host = (urlparse(t["target_url"]).hostname or "").lower()
+    logged_in = False
+    started = time.monotonic()
+    async with gate.slot(host), pages:
+        page = await context.new_page()
+        try:
+            await page.goto(t["target_url"], wait_until="domcontentloaded", timeout=60000)
+            if await needs_login(page):
+                # één login per site tegelijk; de context deelt cookies, dus opnieuw kijken na de lock
+                lock = login_locks.setdefault(t["login_url"], asyncio.Lock())
+                async with lock:
+                    await page.goto(t["target_url"], wait_until="domcontentloaded", timeout=60000)
+                    if await needs_login(page):
+                        await login(page, t)
+                        logged_in = True
+
+            sel_text = ""
+            if t.get("css_selector"):
+                try:
+                    await page.wait_for_selector(t["css_selector"], timeout=15000)
+                    el = page.locator(t["css_selector"]).first
+                    if await el.is_visible():
+                        sel_text = await el.text_content() or ""
+                except Exception:
+                    print(f"[{name}] css_selector not found within timeout.")
+            elif checker.READY_TIMEOUT_MS > 0:
+                js, needles = checker.ready_script(t)
+                try:
+                    await page.wait_for_function(js, arg=needles, timeout=checker.READY_TIMEOUT_MS)
+                except Exception:
+                    print(f"[{name}] Marker not rendered within READY_TIMEOUT_MS.")
+            html, final_url = await page.content(), page.url
+        finally:
+            await page.close()
+    v = checker.evaluate(html, final_url, sel_text, t)
+    v.update(target=t, url=final_url, login=logged_in, seconds=time.monotonic() - started)
+    return v
+
+async def run_all(targets):
+    from playwright.async_api import async_playwright
+    pages = asyncio.Semaphore(max(1, MAX_PAGES))
+    gate = HostGate(PER_HOST_CONCURRENCY, HOST_MIN_INTERVAL_SEC)
+    login_locks = {}
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        try:
+            context = await browser.new_context(user_agent=checker.USER_AGENT,
+                                                storage_state=checker.load_session())
+            if checker.BLOCK_RESOURCES:
+                await context.route("**/*", route_handler)
+            results = await asyncio.gather(
+                *(check_target(context, t, pages, gate, login_locks) for t in targets),
+                return_exceptions=True)
+            if any(isinstance(r, dict) and r["login"] for r in results):
+                checker.save_session(await context.storage_state())
+        finally:
+            await browser.close()
+    return results
+
+def main():
+    for req in ("TELEGRAM_BOT_TOKEN", "TELEGRAM_CHAT_ID"):
+        if not os.getenv(req):
+            print(f"Missing env: {req}", file=sys.stderr); return 2
+    targets = load_targets(TARGETS_FILE)
+    if not targets:
+        print(f"Geen targets in {TARGETS_FILE}.", file=sys.stderr); return 2
+    print(f"Checking {len(targets)} targets (pages={MAX_PAGES}, per host={PER_HOST_CONCURRENCY}).")
+
+    results = asyncio.run(run_all(targets))
+
+    store = checker.get_store()
+    changed, alerts, new_slots = False, [], []
+    for t, r in zip(targets, results):
+        name = t["name"]
+        if isinstance(r, BaseException):
+            print(f"[{name}] ERROR: {r!r}", file=sys.stderr)
+            continue
+        if r["verdict"] != "ok":
+            print(f"[{name}] Geen verdict ({r['verdict']}); final URL: {r['url']}")
+            continue
+        available, slots = r["available"], r["slots"]
+        prev_st = store.get(name) or {}
+        prev = prev_st.get("available")
+        diff = checker.diff_slots(prev_st, slots)
+        if diff is not None:
+            if available and diff[0]:
+                new_slots += [f"{name}: {label}" for label in diff[0].values()]
+        elif available and prev is not True:
+            alerts.append(name)
+        if prev is None or available != prev or (diff is not None and any(diff)) or \
+                (slots is not None and "slots" not in prev_st):
+            st = {"available": available}
+            if slots is not None: st["slots"] = slots
+            store.set(name, st)
+            changed = True
+        print(f"[{name}] Status: {'BESCHIKBAAR' if available else 'GEEN'} ({r['seconds']:.1f}s)")
+
+    if alerts:
+        checker.send_telegram("🎉 Er lijken dagen beschikbaar bij: " + ", ".join(alerts) + ". Check de site nu.")
+        print("Notificatie verstuurd.")
+    if new_slots:
+        checker.send_telegram(checker.slots_message(dict(enumerate(new_slots))))
+        print("Notificatie verstuurd.")
+    if changed:
+        store.export(state_store.STATE_FILE)   # state.json blijft de git-versie
+        print("STATE_CHANGED=1")
+    return 0
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except Exception:
+        print("UNCAUGHT EXCEPTION:", file=sys.stderr)
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,188 @@
+# notifier.py
+# Gedeelde Telegram-notifier: berichten gaan via een achtergrond-queue, zodat een check
+# nooit wacht op Telegram. Eén keep-alive sessie, retries met exponentiële backoff
+# (429 → `retry_after` van Telegram), rate limiting per chat, en bursts binnen
+# NOTIFY_COALESCE_SEC worden per chat samengevoegd tot één bericht.
+# Env:
+# - TELEGRAM_API (default "https://api.telegram.org")
+# - NOTIFY_COALESCE_SEC (default 2), NOTIFY_MIN_INTERVAL_SEC (default 1, per chat)
+# - NOTIFY_MAX_RETRIES (default 5)
+#
+# Gebruik:
+#   n = get_notifier(token); n.send(chat_id, "tekst")   # niet-blokkerend
+#   n.flush()                                           # wachten tot alles weg is
+# Bij exit worden alle notifiers automatisch geflusht (atexit → close_all).
+
+import os, sys, time, queue, random, atexit, threading
+
+MAX_MESSAGE_LEN         = 4096   # Telegram-limiet per bericht
+_CONFIG = []                     # instellingen waarmee de huidige notifiers gemaakt zijn
+
+def load_config():
+    """(Her)leest de env; checker.load_config() roept dit aan (ook per check in de worker).
+    Bestaande notifiers met andere instellingen worden geflusht en gesloten."""
+    global TELEGRAM_API, NOTIFY_COALESCE_SEC, NOTIFY_MIN_INTERVAL_SEC, NOTIFY_MAX_RETRIES
+    old = list(_CONFIG)
+    TELEGRAM_API            = os.getenv("TELEGRAM_API", "https://api.telegram.org")
+    NOTIFY_COALESCE_SEC     = float(os.getenv("NOTIFY_COALESCE_SEC", "2"))
+    NOTIFY_MIN_INTERVAL_SEC = float(os.getenv("NOTIFY_MIN_INTERVAL_SEC", "1"))
+    NOTIFY_MAX_RETRIES      = int(os.getenv("NOTIFY_MAX_RETRIES", "5"))
+    _CONFIG[:] = [TELEGRAM_API, NOTIFY_COALESCE_SEC, NOTIFY_MIN_INTERVAL_SEC, NOTIFY_MAX_RETRIES]
+    if old and old != _CONFIG:
+        close_all()
+
+load_config()
+
+_STOP = object()
+
+def split_message(text, limit=MAX_MESSAGE_LEN):
+    """Knip op regelgrenzen in stukken van hoogstens `limit` tekens."""
+    parts, cur = [], ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if cur: parts.append(cur); cur = ""
+            parts.append(line[:limit]); line = line[limit:]
+        if cur and len(cur) + 1 + len(line) > limit:
+            parts.append(cur); cur = line
+        else:
+            cur = f"{cur}\n{line}" if cur else line
+    if cur:
+        parts.append(cur)
+    return parts
+
+class Notifier:
+    def __init__(self, token, api=None, coalesce_sec=None, min_interval=None, max_retries=None, backoff=1.0):
+        self.url = f"{api or TELEGRAM_API}/bot{token}/sendMessage"
+        self.coalesce_sec = NOTIFY_COALESCE_SEC if coalesce_sec is None else coalesce_sec
+        self.min_interval = NOTIFY_MIN_INTERVAL_SEC if min_interval is None else min_interval
+        self.max_retries = NOTIFY_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = backoff
+        import requests   # pas laden als er echt iets verstuurd wordt
+        self.session = requests.Session()
+        self._q = queue.Queue()
+        self._last_sent = {}      # chat_id → monotonic tijd van laatste bericht
+        self._failed = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+        self._thread.start()
+
+    # ---- publieke API ----
+    def send(self, chat_id, text):
+        """Zet een bericht in de queue; blokkeert niet."""
+        if self._closed:
+            raise RuntimeError("Notifier is gesloten.")
+        self._q.put((str(chat_id), text))
+
+    def flush(self, timeout=60):
+        """Wacht tot de queue leeg is. Geeft het aantal mislukte berichten sinds de vorige flush."""
+        deadline = time.monotonic() + timeout
+        while self._q.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        failed, self._failed = self._failed, 0
+        if self._q.unfinished_tasks:
+            print(f"Notifier: {self._q.unfinished_tasks} bericht(en) nog niet verstuurd na {timeout}s.",
+                  file=sys.stderr)
+            failed += self._q.unfinished_tasks
+        return failed
+
+    def close(self, timeout=60):
+        if self._closed: return 0
+        failed = self.flush(timeout)
+        self._closed = True
+        self._q.put(_STOP)
+        self._thread.join(timeout=5)
+        self.session.close()
+        return failed
+
+    # ---- worker ----
+    def _run(self):
+        while True:
+            item = self._q.get()
+            if item is _STOP:
+                self._q.task_done(); return
+            batch, stop = [item], False
+            deadline = time.monotonic() + self.coalesce_sec
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: break
+                try:
+                    nxt = self._q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True; self._q.task_done(); break
+                batch.append(nxt)
+
+            by_chat = {}
+            for chat, text in batch:
+                by_chat.setdefault(chat, []).append(text)
+            for chat, texts in by_chat.items():
+                if len(texts) > 1:
+                    print(f"Notifier: {len(texts)} berichten voor chat {chat} samengevoegd.")
+                for part in split_message("\n\n".join(texts)):
+                    try:
+                        ok = self._deliver(chat, part)
+                    except Exception as e:
+                        print(f"Telegram error: {e}", file=sys.stderr); ok = False
+                    if not ok:
+                        self._failed += 1
+            for _ in batch:
+                self._q.task_done()
+            if stop:
+                return
+
+    def _wait_rate(self, chat):
+        wait = self._last_sent.get(chat, 0) + self.min_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_sent[chat] = time.monotonic()
+
+    def _deliver(self, chat, text):
+        import requests
+        for attempt in range(self.max_retries + 1):
+            self._wait_rate(chat)
+            retry_after = None
+            try:
+                r = self.session.post(self.url, data={"chat_id": chat, "text": text}, timeout=20)
+            except requests.RequestException as e:
+                err = str(e)
+            else:
+                if r.ok:
+                    return True
+                err = f"HTTP {r.status_code}"
+                if r.status_code == 429:
+                    try: retry_after = (r.json().get("parameters") or {}).get("retry_after")
+                    except ValueError: pass
+                elif r.status_code < 500:
+                    print(f"Telegram error: {err} {r.text[:200]}", file=sys.stderr)
+                    return False   # 4xx (behalve 429): opnieuw proberen heeft geen zin
+            if attempt == self.max_retries:
+                break
+            delay = float(retry_after) if retry_after else \
+                min(60.0, self.backoff * 2 ** attempt) * (0.5 + random.random() / 2)
+            print(f"Telegram retry {attempt + 1}/{self.max_retries} in {delay:.1f}s ({err})", file=sys.stderr)
+            time.sleep(delay)
+        print(f"Telegram error: gave up after {self.max_retries + 1} attempts ({err})", file=sys.stderr)
+        return False
+
+_NOTIFIERS = {}
+_LOCK = threading.Lock()
+
+def get_notifier(token, api=None):
+    """Eén Notifier per bot-token per proces; wordt bij exit geflusht."""
+    with _LOCK:
+        key = (token, api or TELEGRAM_API)
+        if key not in _NOTIFIERS:
+            _NOTIFIERS[key] = Notifier(token, key[1])
+        return _NOTIFIERS[key]
+
+def flush_all(timeout=60):
+    """Wacht tot alle notifiers leeg zijn; geeft het totaal aantal mislukte berichten."""
+    return sum(n.flush(timeout) for n in list(_NOTIFIERS.values()))
+
+@atexit.register
+def close_all(timeout=60):
+    with _LOCK:
+        notifiers = list(_NOTIFIERS.values())
+        _NOTIFIERS.clear()
+    return sum(n.close(timeout) for n in notifiers)
@@ -0,0 +1,137 @@
+# scheduler.py
+# Adaptieve planning van de daemon-checks (python checker.py --daemon), i.p.v. een vaste
+# random sleep tussen MIN_SLEEP_SEC en MAX_SLEEP_SEC:
+# - budget: een vast aantal checks per run, verdeeld over de actieve tijd (quiet hours tellen niet mee)
+# - sneller rond tijdstippen (tijd van de dag) waarop eerder een overgang is gezien
+# - trager na fouten, 429/503 (Retry-After) en trage checks
+# - jitter blijft
+# Env:
+# - DAEMON_CHECK_BUDGET (checks per run; default = wat de random sleep gemiddeld zou doen)
+# - HOT_WINDOW_MIN (default 30): breedte (σ, minuten) van een "hete" periode rond een eerdere overgang
+# - HOT_BOOST (default 3): hoeveel keer vaker checken op het heetst
+# - HISTORY_DAYS (default 28): hoe ver terug overgangen meetellen
+# - SLOW_CHECK_SEC (default 30), BACKOFF_MAX_SEC (default 1800), SCHEDULE_JITTER (default 0.2)
+
+import os, math, random
+import datetime as dt
+
+def load_config():
+    """(Her)leest de env; checker.load_config() roept dit aan (ook per check in de worker)."""
+    global DAEMON_CHECK_BUDGET, HOT_WINDOW_MIN, HOT_BOOST, HISTORY_DAYS, SLOW_CHECK_SEC, \
+           BACKOFF_MAX_SEC, SCHEDULE_JITTER
+    DAEMON_CHECK_BUDGET = int(os.getenv("DAEMON_CHECK_BUDGET") or "0")
+    HOT_WINDOW_MIN      = float(os.getenv("HOT_WINDOW_MIN") or "30")
+    HOT_BOOST           = float(os.getenv("HOT_BOOST") or "3")
+    HISTORY_DAYS        = int(os.getenv("HISTORY_DAYS") or "28")
+    SLOW_CHECK_SEC      = float(os.getenv("SLOW_CHECK_SEC") or "30")
+    BACKOFF_MAX_SEC     = float(os.getenv("BACKOFF_MAX_SEC") or "1800")
+    SCHEDULE_JITTER     = float(os.getenv("SCHEDULE_JITTER") or "0.2")
+
+load_config()
+
+class Throttled(Exception):
+    """De site vraagt om af te remmen (429/503), eventueel met Retry-After."""
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status} (Retry-After: {retry_after or '-'})")
+        self.status, self.retry_after = status, retry_after
+
+def throttle_info(exc):
+    """(throttled, retry_after_s) uit een Throttled of een requests.HTTPError met 429/503."""
+    if isinstance(exc, Throttled):
+        status, ra = exc.status, exc.retry_after
+    else:
+        resp = getattr(exc, "response", None)
+        if resp is None or resp.status_code not in (429, 503):
+            return False, None
+        status, ra = resp.status_code, resp.headers.get("Retry-After")
+    try:
+        return True, max(0.0, float(ra))
+    except (TypeError, ValueError):
+        return True, None   # HTTP-date of ontbrekend: gewoon exponentieel afremmen
+
+def _minute_of_day(t):
+    return t.hour * 60 + t.minute + t.second / 60
+
+class PollScheduler:
+    """
+    Verdeelt de resterende checks over de resterende actieve tijd, met meer checks waar het
+    "heet" is: interval(t) = (Σ gewicht over de rest van de run) / (resterend budget × gewicht(t)).
+    Zonder historie is dat een constant interval dat precies het budget opmaakt.
+    """
+    def __init__(self, end, tz, min_sleep, max_sleep, is_quiet=None, transitions=(), budget=0, now=None):
+        now = now or dt.datetime.now(tz)
+        self.end, self.tz = end, tz                      # end: aware datetime
+        self.min_sleep, self.max_sleep = min_sleep, max(min_sleep, max_sleep)
+        self.is_quiet = is_quiet or (lambda t: False)
+        self.hot_minutes = self._hot_minutes(transitions, now)
+        self.budget = budget or max(1, int(self._active_seconds(now) / ((self.min_sleep + self.max_sleep) / 2)))
+        self.done = 0
+        self.errors = 0          # opeenvolgende fouten
+        self.throttled = None    # (retry_after of None) na een 429/503
+        self.slow = False
+
+    def _hot_minutes(self, transitions, now):
+        since = now - dt.timedelta(days=HISTORY_DAYS)
+        out = []
+        for tr in transitions:
+            try:
+                ts = dt.datetime.fromisoformat(tr["ts"]).astimezone(self.tz)
+            except (KeyError, TypeError, ValueError):
+                continue
+            if ts >= since:
+                out.append(_minute_of_day(ts))
+        return out
+
+    def hotness(self, t):
+        """0..1: hoe dicht tijdstip t (tijd van de dag) bij een eerdere overgang ligt."""
+        if not self.hot_minutes or HOT_WINDOW_MIN <= 0:
+            return 0.0
+        m = _minute_of_day(t.astimezone(self.tz))
+        d = min(min(abs(m - h), 1440 - abs(m - h)) for h in self.hot_minutes)
+        return math.exp(-0.5 * (d / HOT_WINDOW_MIN) ** 2)
+
+    def weight(self, t):
+        return 1.0 + HOT_BOOST * self.hotness(t)
+
+    def _steps(self, now, step=60):
+        t = now
+        while t < self.end:
+            yield t
+            t += dt.timedelta(seconds=step)
+
+    def _active_seconds(self, now):
+        return sum(60 for t in self._steps(now) if not self.is_quiet(t))
+
+    def observe(self, ok, seconds, throttled=False, retry_after=None):
+        """Uitkomst van de laatste check doorgeven."""
+        self.done += 1
+        self.errors = 0 if ok else self.errors + 1
+        self.throttled = (retry_after,) if throttled else None
+        self.slow = seconds > SLOW_CHECK_SEC
+
+    def next_delay(self, now=None):
+        """(seconden tot de volgende check, korte uitleg voor de log)."""
+        now = now or dt.datetime.now(self.tz)
+        left = max(1, self.budget - self.done)
+        total_w = sum(self.weight(t) for t in self._steps(now) if not self.is_quiet(t)) * 60
+        w = self.weight(now)
+        delay = total_w / (left * w) if total_w else self.max_sleep
+        delay *= random.uniform(1 - SCHEDULE_JITTER, 1 + SCHEDULE_JITTER)
+        delay = min(self.max_sleep, max(self.min_sleep, delay))
+        why = [f"budget {self.done}/{self.budget}"]
+        if w > 1.05:
+            why.append(f"hot x{w:.1f}")
+        if self.errors:
+            backoff = min(BACKOFF_MAX_SEC, self.min_sleep * 2 ** self.errors)
+            delay = max(delay, backoff * random.uniform(0.8, 1.0))
+            why.append(f"{self.errors} error(s)")
+        cap = max(BACKOFF_MAX_SEC, self.max_sleep)
+        if self.throttled is not None:
+            ra = self.throttled[0]
+            cap = max(cap, ra or 0)   # Retry-After altijd respecteren
+            delay = max(delay, ra if ra is not None else min(BACKOFF_MAX_SEC, 2 * delay))
+            why.append("throttled")
+        if self.slow:
+            delay *= 1.5
+            why.append("slow")
+        return int(min(max(delay, 1), cap)), ", ".join(why)
@@ -0,0 +1,123 @@
+# snapshots.py
+# Debug-snapshots (DEBUG_SNAPSHOT=1 in checker.py), alleen wanneer ze iets zeggen:
+# - bij een verandering van het verdict, bij anomalieën (loginpagina, URL mismatch,
+#   CONFIRM_TEXT ontbreekt) en steekproefsgewijs (SNAPSHOT_SAMPLE)
+# - HTML gzip-gecomprimeerd, screenshot als JPEG; wegschrijven in een achtergrond-thread
+# - ring buffer in SNAPSHOT_DIR: oudste snapshots weg zodra de map groter is dan SNAPSHOT_MAX_MB
+# - index.jsonl in dezelfde map: één regel per snapshot (ts, reden, verdict, url, bestanden)
+# Env:
+# - SNAPSHOT_DIR (default "snapshots"), SNAPSHOT_MAX_MB (default 50)
+# - SNAPSHOT_SAMPLE (default 0.02 = 2% van de gewone checks), SNAPSHOT_JPEG_QUALITY (default 60)
+
+import os, sys, json, gzip, time, queue, random, atexit, threading
+import datetime as dt
+
+INDEX_FILE            = "index.jsonl"
+
+def load_config():
+    """(Her)leest de env; checker.load_config() roept dit aan (ook per check in de worker)."""
+    global SNAPSHOT_DIR, SNAPSHOT_MAX_MB, SNAPSHOT_SAMPLE, SNAPSHOT_JPEG_QUALITY
+    SNAPSHOT_DIR          = os.getenv("SNAPSHOT_DIR") or "snapshots"
+    SNAPSHOT_MAX_MB       = float(os.getenv("SNAPSHOT_MAX_MB") or "50")
+    SNAPSHOT_SAMPLE       = float(os.getenv("SNAPSHOT_SAMPLE") or "0.02")
+    SNAPSHOT_JPEG_QUALITY = int(os.getenv("SNAPSHOT_JPEG_QUALITY") or "60")
+
+load_config()
+
+ANOMALIES = ("login", "url_mismatch", "unconfirmed")
+
+def reason_for(verdict, changed=False):
+    """Waarom deze check een snapshot verdient, of None."""
+    if verdict in ANOMALIES:
+        return verdict
+    if changed:
+        return "change"
+    if verdict == "ok" and SNAPSHOT_SAMPLE > 0 and random.random() < SNAPSHOT_SAMPLE:
+        return "sample"
+    return None
+
+class SnapshotWriter:
+    def __init__(self, directory=None, max_bytes=None):
+        # absoluut pad: de worker (checker.py --serve) wisselt per check van cwd
+        self.dir = os.path.abspath(directory or SNAPSHOT_DIR)
+        self.max_bytes = SNAPSHOT_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        self._q = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="snapshots", daemon=True)
+        self._thread.start()
+
+    def submit(self, meta, html, jpeg=None):
+        """meta: dict met o.a. reason/verdict/url; html: str; jpeg: bytes of None. Blokkeert niet."""
+        self._q.put((meta, html, jpeg))
+
+    def flush(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while self._q.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def _run(self):
+        while True:
+            item = self._q.get()
+            try:
+                self._write(*item)
+            except Exception as e:
+                print(f"Snapshot write failed: {e}", file=sys.stderr)
+            finally:
+                self._q.task_done()
+
+    def _write(self, meta, html, jpeg):
+        os.makedirs(self.dir, exist_ok=True)
+        now = dt.datetime.now(dt.timezone.utc)
+        stem = f"{now.strftime('%Y%m%dT%H%M%S%f')}-{meta.get('reason', 'snap')}"
+        files = []
+        if html:
+            name = stem + ".html.gz"
+            with gzip.open(os.path.join(self.dir, name), "wt", encoding="utf-8", compresslevel=6) as f:
+                f.write(html)
+            files.append(name)
+        if jpeg:
+            name = stem + ".jpg"
+            with open(os.path.join(self.dir, name), "wb") as f:
+                f.write(jpeg)
+            files.append(name)
+        entry = dict(meta, ts=now.isoformat(timespec="seconds"), files=files,
+                     bytes=sum(os.path.getsize(os.path.join(self.dir, n)) for n in files))
+        with open(os.path.join(self.dir, INDEX_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        print(f"Snapshot saved ({entry['reason']}): {', '.join(files)}")
+        self._prune()
+
+    def _prune(self):
+        """Oudste snapshots weg tot de map weer binnen max_bytes past; index herschrijven."""
+        index = os.path.join(self.dir, INDEX_FILE)
+        with open(index, "r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        total = sum(e.get("bytes", 0) for e in entries)
+        drop = 0
+        while total > self.max_bytes and drop < len(entries) - 1:   # de nieuwste blijft altijd
+            total -= entries[drop].get("bytes", 0)
+            for name in entries[drop].get("files", []):
+                try: os.remove(os.path.join(self.dir, name))
+                except FileNotFoundError: pass
+            drop += 1
+        if drop:
+            tmp = index + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for e in entries[drop:]:
+                    f.write(json.dumps(e, ensure_ascii=False) + "\n")
+            os.replace(tmp, index)
+
+_WRITER = {"writer": None}
+
+def get_writer():
+    """Eén writer per map; verandert SNAPSHOT_DIR (of de cwd), dan eerst de oude leegmaken."""
+    w = _WRITER["writer"]
+    if w is None or w.dir != os.path.abspath(SNAPSHOT_DIR) or w.max_bytes != SNAPSHOT_MAX_MB * 1024 * 1024:
+        if w is not None:
+            w.flush()
+        w = _WRITER["writer"] = SnapshotWriter()
+    return w
+
+@atexit.register
+def flush():
+    if _WRITER["writer"] is not None:
+        _WRITER["writer"].flush()
@@ -0,0 +1,162 @@
+# state_store.py
+# Opslag van de laatste status per target, met twee backends:
+# - "json":   state.json (standaard; zo kan de one-shot workflow het bestand in git committen)
+# - "sqlite": atomair en crash-safe (WAL), met historie van alle overgangen
+# Env:
+# - STATE_BACKEND ("json" | "sqlite"), STATE_FILE (default "state.json"), STATE_DB (default "state.db")
+#
+# Een state is een dict per target, minimaal {"available": True|False|None}.
+
+import os, json, sqlite3, threading
+import datetime as dt
+
+def load_config():
+    """(Her)leest de env; checker.load_config() roept dit aan (ook per check in de worker)."""
+    global STATE_BACKEND, STATE_FILE, STATE_DB
+    STATE_BACKEND = (os.getenv("STATE_BACKEND") or "json").strip().lower()
+    STATE_FILE    = os.getenv("STATE_FILE", "state.json")
+    STATE_DB      = os.getenv("STATE_DB", "state.db")
+
+load_config()
+
+def _now():
+    return dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds")
+
+def read_state_file(path, default_name="default"):
+    """{naam: state} uit een state.json; oud formaat {"available": x} → default_name."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            st = json.load(f)
+    except Exception:
+        return {}
+    if "targets" in st:
+        return st["targets"] or {}
+    return {default_name: {"available": st["available"]}} if "available" in st else {}
+
+def write_state_file(path, targets):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"targets": targets}, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+class JsonStateStore:
+    """Alles in één JSON-bestand; writes via tmp-file + os.replace (atomair), geen historie."""
+    def __init__(self, path=None, default_name="default"):
+        self.path, self.default_name = path or STATE_FILE, default_name
+        self._lock = threading.Lock()
+
+    def all(self):
+        return read_state_file(self.path, self.default_name)
+
+    def get(self, target):
+        return self.all().get(target)
+
+    def set(self, target, state):
+        """Slaat op; geeft True terug als "available" veranderde."""
+        with self._lock:
+            targets = self.all()
+            old = (targets.get(target) or {}).get("available")
+            targets[target] = state
+            write_state_file(self.path, targets)
+        return old != state.get("available")
+
+    def transitions(self, target=None, since=None):
+        return []
+
+    def export(self, path):
+        if os.path.abspath(path) != os.path.abspath(self.path):
+            write_state_file(path, self.all())
+
+class SqliteStateStore:
+    """
+    SQLite (WAL, synchronous=FULL): elke set() is één transactie, dus atomair en crash-safe.
+    Overgangen van "available" worden bewaard in `transitions`.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS state (
+            target TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS transitions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, target TEXT NOT NULL, ts TEXT NOT NULL,
+            old TEXT, new TEXT);
+        CREATE INDEX IF NOT EXISTS transitions_target_ts ON transitions (target, ts);
+    """
+
+    def __init__(self, path=None, seed_file=None, default_name="default"):
+        self.path = path or STATE_DB
+        seed_file = STATE_FILE if seed_file is None else seed_file
+        with self._conn() as c:
+            c.execute("PRAGMA journal_mode=WAL")
+            c.executescript(self.SCHEMA)
+            empty = c.execute("SELECT COUNT(*) FROM state").fetchone()[0] == 0
+        if empty and seed_file:
+            # eerste start: overnemen uit de (git-)state.json
+            for target, st in read_state_file(seed_file, default_name).items():
+                self.set(target, st, record=False)
+
+    def _conn(self):
+        # verbinding per operatie: goedkoop, en veilig vanuit de git-sync-thread
+        c = sqlite3.connect(self.path, timeout=30)
+        c.execute("PRAGMA synchronous=FULL")
+        return c
+
+    def all(self):
+        c = self._conn()
+        try:
+            return {t: json.loads(d) for t, d in c.execute("SELECT target, data FROM state")}
+        finally:
+            c.close()
+
+    def get(self, target):
+        c = self._conn()
+        try:
+            row = c.execute("SELECT data FROM state WHERE target = ?", (target,)).fetchone()
+            return json.loads(row[0]) if row else None
+        finally:
+            c.close()
+
+    def set(self, target, state, record=True):
+        """Slaat op; geeft True terug als "available" veranderde (en legt die overgang vast)."""
+        c = self._conn()
+        try:
+            with c:  # één transactie
+                c.execute("BEGIN IMMEDIATE")
+                row = c.execute("SELECT data FROM state WHERE target = ?", (target,)).fetchone()
+                old = json.loads(row[0]).get("available") if row else None
+                now = _now()
+                c.execute("INSERT INTO state (target, data, updated_at) VALUES (?, ?, ?) "
+                          "ON CONFLICT(target) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                          (target, json.dumps(state, ensure_ascii=False), now))
+                changed = old != state.get("available")
+                if changed and record:
+                    c.execute("INSERT INTO transitions (target, ts, old, new) VALUES (?, ?, ?, ?)",
+                              (target, now, json.dumps(old), json.dumps(state.get("available"))))
+            return changed
+        finally:
+            c.close()
+
+    def transitions(self, target=None, since=None):
+        """[{"target", "ts", "old", "new"}], oudste eerst."""
+        q, args = "SELECT target, ts, old, new FROM transitions WHERE 1=1", []
+        if target is not None:
+            q += " AND target = ?"; args.append(target)
+        if since is not None:
+            q += " AND ts >= ?"; args.append(since)
+        c = self._conn()
+        try:
+            return [{"target": t, "ts": ts, "old": json.loads(o), "new": json.loads(n)}
+                    for t, ts, o, n in c.execute(q + " ORDER BY id", args)]
+        finally:
+            c.close()
+
+    def export(self, path):
+        write_state_file(path, self.all())
+
+def open_store(backend=None, default_name="default"):
+    backend = backend or STATE_BACKEND
+    if backend == "sqlite":
+        return SqliteStateStore(STATE_DB, STATE_FILE, default_name)
+    if backend != "json":
+        raise ValueError(f"Onbekende STATE_BACKEND: {backend}")
+    return JsonStateStore(STATE_FILE, default_name)
@@ -1,15 +1,15 @@
 import os
-import requests
+import notifier
 
 # Haalt de waarden uit GitHub Secrets (komt via workflow)
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
 def send_telegram(msg: str):
-    url = f"https://api.telegram.org/bot{TOKEN}/sendMessage"
-    data = {"chat_id": CHAT_ID, "text": msg}
-    r = requests.post(url, data=data, timeout=10)
-    r.raise_for_status()
+    n = notifier.get_notifier(TOKEN)
+    n.send(CHAT_ID, msg)
+    if n.flush():
+        raise RuntimeError("Bericht niet verstuurd (zie log)")
     print("Bericht verstuurd:", msg)
 
 def main():